@@ -1,24 +1,169 @@
-from flask import Flask, request, jsonify, send_file, render_template_string
-import os
+from flask import Flask, Response, g, request, jsonify, send_file, render_template_string
+from functools import wraps
+import json, os, queue
+from audit import chain_records, parallel_audit
 from blockchain import Blockchain
+from chainbin import iter_encoded
+from difficulty import DifficultyController
+from index import IndexUnavailable, block_records, canonical_record, normalize
+from miner import CAN_FORK, make_miner
+from mining_queue import MiningQueue
+from replication import Replicator
+from snapshots import SnapshotCache
 
 app = Flask(__name__, template_folder=os.path.join(os.path.dirname(__file__), "templates"))
 
 DATA_FILE = os.path.join(os.path.dirname(__file__), "blockchain_data.json")
-bc = Blockchain(difficulty=3)
-if os.path.exists(DATA_FILE):
-    try:
-        bc = Blockchain.load_from_file(DATA_FILE, difficulty=3)
-    except Exception as e:
-        print("Could not load existing blockchain file:", e)
+# CHAIN_STORE lets several local instances (one per PORT) keep separate stores
+STORE_DIR = os.environ.get("CHAIN_STORE", os.path.join(os.path.dirname(__file__), "blockchain_store"))
+# MINER_WORKERS > 1 spreads proof-of-work over that many processes; worth it from difficulty ~5 up
+miner = make_miner(int(os.environ.get("MINER_WORKERS", 1)))
+# record fields searchable through /search, comma separated
+INDEX_FIELDS = [f.strip() for f in os.environ.get("INDEX_FIELDS", "Tên địa điểm,Số điện thoại").split(",") if f.strip()]
+# lazy: serve blocks from the memory-mapped log on demand; eager: decode the whole chain at startup
+LAZY_LOAD = os.environ.get("CHAIN_LOAD_MODE", "lazy") == "lazy"
+# segments (append-only log files) or sqlite (blockchain_store/chain.sqlite3)
+BACKEND = os.environ.get("CHAIN_BACKEND", "segments")
+# sealed segments beyond the newest ARCHIVE_KEEP_SEGMENTS are compressed into archives ("off" disables)
+ARCHIVE_KEEP = os.environ.get("ARCHIVE_KEEP_SEGMENTS", "2")
+STORAGE_OPTS = {"archive_keep": int(ARCHIVE_KEEP)} if BACKEND == "segments" and ARCHIVE_KEEP != "off" else {}
+# DEDUP_RECORDS=1: a record already in the chain is answered with its block instead of being mined again
+DEDUP = os.environ.get("DEDUP_RECORDS", "0") == "1"
+# minimum proof-of-work difficulty, enforced when validating
+DIFFICULTY = int(os.environ.get("CHAIN_DIFFICULTY", 3))
+# TARGET_BLOCK_SECONDS turns on retargeting between DIFFICULTY and MAX_DIFFICULTY
+TARGET_BLOCK_SECONDS = os.environ.get("TARGET_BLOCK_SECONDS")
+controller = None
+if TARGET_BLOCK_SECONDS:
+    controller = DifficultyController(float(TARGET_BLOCK_SECONDS), min_difficulty=DIFFICULTY,
+                                      max_difficulty=int(os.environ.get("MAX_DIFFICULTY", DIFFICULTY + 3)))
+try:
+    # the legacy JSON file is imported once, when the segment store is still empty
+    bc = Blockchain.open(STORE_DIR, difficulty=DIFFICULTY, import_path=DATA_FILE, miner=miner,
+                         index_fields=INDEX_FIELDS, lazy=LAZY_LOAD, backend=BACKEND, controller=controller, dedup=DEDUP,
+                         **STORAGE_OPTS)
+except Exception as e:
+    # an in-memory chain would accept writes and lose them all at the next restart
+    raise SystemExit(f"Could not open the blockchain store {STORE_DIR}: {e}")
+# whole-chain responses rendered once per tip, plain and gzipped
+snapshots = SnapshotCache(os.path.join(STORE_DIR, "snapshots"))
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# every append goes through this single mining worker
+mining_queue = MiningQueue(bc, maxsize=int(os.environ.get("MINING_QUEUE_SIZE", 1000)))
+# LEADER_URL makes this node a read-only follower that pulls new blocks from the leader
+LEADER_URL = os.environ.get("LEADER_URL")
+replicator = None
+if LEADER_URL:
+    replicator = Replicator(bc, LEADER_URL, interval=float(os.environ.get("REPLICATION_INTERVAL", 5)))
+    replicator.start()
 
 @app.route('/', methods=['GET'])
 def home():
-    return "Blockchain API - endpoints: /chain, /add (POST JSON), /validate, /download, /history"
+    return "Blockchain API - endpoints: /chain (?from_height=&limit= | ?since_hash=), /chain/stream, /add (POST JSON), /add_batch (POST JSON list), /pending/<ticket>, /block/<hash>, /block/height/<n>, /search?field=&value=, /validate, /download (?format=bin), /history, /replication/status, /replication/sync (POST), /metrics, /segments"
+
+@app.errorhandler(IndexUnavailable)
+def index_unavailable(e):
+    # /search and dedup lookups while the background index rebuild is running or has failed
+    return jsonify({'error': str(e)}), 503
+
+def tip_etag(f):
+    """Tag responses with the chain tip and answer a matching If-None-Match with 304.
+
+    The height the tag was computed at is kept in g.chain_height so the view
+    renders exactly that prefix of the chain.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        tip = bc.last_block
+        g.chain_height = tip.index + 1
+        g.chain_etag = f'{tip.index + 1}-{tip.hash}'
+        if request.if_none_match.contains(g.chain_etag):
+            response = Response(status=304)
+        else:
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(g.chain_etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return decorated_function
+
+def send_snapshot(name, render, mimetype, download_name=None, binary=False):
+    """Serve the cached snapshot for the current tip, gzipped when the client accepts it."""
+    height = g.chain_height
+    path, gz_path = snapshots.get(name, g.chain_etag, lambda: render(height), binary=binary)
+    use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    response = send_file(gz_path if use_gzip else path, mimetype=mimetype, etag=False,
+                         as_attachment=download_name is not None, download_name=download_name)
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+def render_chain_json(height):
+    yield '['
+    for i, b in enumerate(bc.iter_blocks(0, height)):
+        yield (',' if i else '') + json.dumps(b.to_dict(), ensure_ascii=False)
+    yield ']'
+
+def read_cursor(default_limit=None):
+    """(from_height, limit) from ?from_height=&limit= or ?since_hash=.
+
+    Raises LookupError for an unknown hash and ValueError for bad numbers.
+    """
+    since_hash = request.args.get('since_hash')
+    if since_hash:
+        height = bc.height_of(since_hash)
+        if height is None:
+            raise LookupError('Unknown since_hash')
+        from_height = height + 1
+    else:
+        from_height = request.args.get('from_height', 0, type=int)
+    limit = request.args.get('limit', default_limit, type=int)
+    if from_height < 0 or (limit is not None and limit <= 0):
+        raise ValueError('from_height must be >= 0 and limit > 0')
+    if limit is not None:
+        limit = min(limit, MAX_PAGE_SIZE)
+    return from_height, limit
+
+def chain_page(from_height, limit, raw=False):
+    # raw keeps the float timestamps of to_record, so peers can re-hash blocks in any TZ
+    blocks = [b.to_record() if raw else b.to_dict() for b in bc.iter_blocks(from_height, limit)]
+    next_height = from_height + len(blocks)
+    height = len(bc.chain)
+    return {'blocks': blocks, 'height': height,
+            'next_from_height': next_height if next_height < height else None}
 
 @app.route('/chain', methods=['GET'])
+@tip_etag
 def get_chain():
-    return jsonify(bc.to_list()), 200
+    paged = any(k in request.args for k in ('from_height', 'limit', 'since_hash'))
+    if not paged:
+        return send_snapshot('chain.json', render_chain_json, 'application/json')
+    try:
+        from_height, limit = read_cursor(DEFAULT_PAGE_SIZE)
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(chain_page(from_height, limit, raw=request.args.get('format') == 'raw')), 200
+
+@app.route('/chain/stream', methods=['GET'])
+@tip_etag
+def stream_chain():
+    """NDJSON, one block per line, same cursor parameters as /chain."""
+    try:
+        from_height, limit = read_cursor()
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def generate():
+        for b in bc.iter_blocks(from_height, limit):
+            yield json.dumps(b.to_dict(), ensure_ascii=False) + '\n'
+    return Response(generate(), mimetype='application/x-ndjson')
 
 @app.route('/add', methods=['POST'])
 def add_block():
@@ -27,25 +172,177 @@ def add_block():
     data = request.get_json()
     if not isinstance(data, dict):
         return jsonify({'error': 'JSON body must be an object/dict'}), 400
-    # allow duplicates as requested
-    block = bc.add_block(data)
-    bc.save_to_file(DATA_FILE)
-    return jsonify(block.to_dict()), 201
+    if set(data) == {'merkle_root', 'records'}:
+        return jsonify({'error': "An object with exactly 'merkle_root' and 'records' is reserved for batch blocks; "
+                                 "send the records to /add_batch"}), 400
+    # duplicates are mined again unless DEDUP_RECORDS is on
+    return enqueue([data])
+
+@app.route('/add_batch', methods=['POST'])
+def add_batch():
+    if not request.is_json:
+        return jsonify({'error': 'Request must be JSON'}), 400
+    body = request.get_json()
+    records = body.get('records') if isinstance(body, dict) else body
+    if not isinstance(records, list) or not records:
+        return jsonify({'error': 'JSON body must be a non-empty list of objects or {"records": [...]}'}), 400
+    if not all(isinstance(r, dict) for r in records):
+        return jsonify({'error': 'Every record must be an object/dict'}), 400
+    return enqueue(records)
+
+def split_duplicates(records):
+    """(new records, duplicates) where each duplicate points at the block, or request item, holding it.
+
+    Answers what is already mined without queueing; records still waiting in
+    the queue are caught again by the mining worker.
+    """
+    fresh, duplicates, seen = [], [], {}
+    for i, record in enumerate(records):
+        encoded = canonical_record(record)
+        if encoded in seen:
+            duplicates.append({'index': i, 'same_as': seen[encoded]})
+            continue
+        seen[encoded] = i
+        found = bc.find_record(record)
+        if found is None:
+            fresh.append(record)
+        else:
+            block, position = found
+            duplicates.append({'index': i, 'height': block.index, 'hash': block.hash, 'position': position})
+    return fresh, duplicates
+
+def enqueue(records):
+    if replicator is not None:
+        return jsonify({'error': 'This node follows a leader; send writes there', 'leader': LEADER_URL}), 403
+    duplicates = None
+    if bc.records is not None:
+        records, duplicates = split_duplicates(records)
+        if not records:
+            body = {'status': 'duplicate', 'records': 0, 'duplicates': duplicates}
+            if len(duplicates) == 1:
+                body['block'] = bc.get_block(duplicates[0]['height']).to_dict()
+            return jsonify(body), 200
+    try:
+        ticket = mining_queue.submit(records)
+    except queue.Full:
+        return jsonify({'error': 'Mining queue is full, retry later'}), 503
+    body = {'ticket': ticket, 'status': 'queued', 'records': len(records), 'pending_url': f'/pending/{ticket}'}
+    if duplicates is not None:
+        body['duplicates'] = duplicates
+    return jsonify(body), 202
+
+@app.route('/pending/<ticket>', methods=['GET'])
+def pending(ticket):
+    # ?wait=<seconds> long-polls until the ticket is mined
+    wait = min(request.args.get('wait', 0, type=float), 30)
+    state = mining_queue.get(ticket, wait=wait)
+    if state is None:
+        return jsonify({'error': 'Unknown ticket'}), 404
+    if state['status'] == 'mined':
+        state['block'] = bc.chain[state['height']].to_dict()
+    elif state['status'] == 'duplicate' and len(state['duplicates']) == 1:
+        state['block'] = bc.chain[state['duplicates'][0]['height']].to_dict()
+    return jsonify(state), 200
+
+@app.route('/block/<block_hash>', methods=['GET'])
+def get_block_by_hash(block_hash):
+    height = bc.height_of(block_hash)
+    if height is None:
+        return jsonify({'error': 'Block not found'}), 404
+    return jsonify(bc.get_block(height).to_dict()), 200
+
+@app.route('/block/height/<int:height>', methods=['GET'])
+def get_block_by_height(height):
+    block = bc.get_block(height)
+    if block is None:
+        return jsonify({'error': 'Block not found'}), 404
+    return jsonify(block.to_dict()), 200
+
+@app.route('/search', methods=['GET'])
+def search():
+    field = request.args.get('field', '')
+    value = request.args.get('value', '')
+    if field not in bc.index.fields:
+        return jsonify({'error': 'field is not indexed', 'indexed_fields': list(bc.index.fields)}), 400
+    matches = []
+    for block in bc.find_blocks(field, value):
+        records = [r for r in block_records(block.data)
+                   if isinstance(r, dict) and field in r and normalize(r[field]) == normalize(value)]
+        matches.append({'height': block.index, 'hash': block.hash, 'records': records})
+    return jsonify({'field': field, 'value': value, 'matches': matches}), 200
 
 @app.route('/validate', methods=['GET'])
 def validate_chain():
-    valid, message = bc.is_chain_valid()
-    return jsonify({'valid': valid, 'message': message}), 200
+    # mode=full re-walks every block; the default only checks blocks above the checkpoint
+    mode = request.args.get('mode', 'incremental')
+    workers = min(request.args.get('workers', 1, type=int), os.cpu_count() or 1)
+    if mode == 'full' and workers > 1 and CAN_FORK:
+        # parallel audit over height ranges; reports every invalid height
+        report = parallel_audit(chain_records(bc), bc.difficulty, workers)
+        if report['valid']:
+            bc.mark_verified(report['last_height'], report['last_hash'])
+        message = 'Chain is valid' if report['valid'] else f"{len(report['invalid'])} invalid blocks"
+        return jsonify({'valid': report['valid'], 'message': message, 'mode': mode, 'workers': workers,
+                        'invalid': report['invalid'], 'elapsed': report['elapsed'],
+                        'verified_height': bc.verified_height}), 200
+    valid, message = bc.is_chain_valid(full=(mode == 'full'))
+    return jsonify({'valid': valid, 'message': message, 'mode': mode,
+                    'verified_height': bc.verified_height}), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    report = bc.metrics.snapshot()
+    report.update(
+        height=len(bc.chain),
+        queue_depth=mining_queue.depth(),
+        difficulty={'next': bc.next_difficulty(), 'minimum': bc.difficulty,
+                    'controller': controller.status() if controller is not None else None},
+    )
+    return jsonify(report), 200
+
+@app.route('/segments', methods=['GET'])
+def segments():
+    # per-segment summaries: height range, first/last hash and, for archives, the digest
+    if not hasattr(bc.storage, 'summaries'):
+        return jsonify({'error': 'Storage backend has no segments'}), 404
+    return jsonify({'segments': bc.storage.summaries()}), 200
+
+@app.route('/replication/status', methods=['GET'])
+def replication_status():
+    if replicator is None:
+        return jsonify({'role': 'leader', 'height': len(bc.chain)}), 200
+    return jsonify(dict(replicator.status(), role='follower')), 200
+
+@app.route('/replication/sync', methods=['POST'])
+def replication_sync():
+    # pull now instead of waiting for the next REPLICATION_INTERVAL
+    if replicator is None:
+        return jsonify({'error': 'LEADER_URL is not set on this node'}), 400
+    try:
+        applied = replicator.sync_once()
+    except Exception as e:
+        return jsonify(dict(replicator.status(), error=str(e))), 502
+    return jsonify(dict(replicator.status(), applied=applied)), 200
 
 @app.route('/download', methods=['GET'])
+@tip_etag
 def download_chain():
-    if not os.path.exists(DATA_FILE):
-        bc.save_to_file(DATA_FILE)
-    return send_file(DATA_FILE, as_attachment=True)
+    # the store is the source of truth; exports are rendered from it once per tip
+    if request.args.get('format') == 'bin':
+        # compact binary format with an offset index, see chainbin.py
+        return send_snapshot('blockchain_data.bin', lambda height: iter_encoded(bc.iter_blocks(0, height)),
+                             'application/octet-stream', download_name='blockchain_data.bin', binary=True)
+    return send_snapshot('blockchain_data.json', lambda height: bc.iter_json(height), 'application/json',
+                         download_name='blockchain_data.json')
 
 @app.route('/history', methods=['GET'])
+@tip_etag
 def history():
-    blocks = bc.to_list()
+    try:
+        from_height, limit = read_cursor(50)
+    except (LookupError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    page = chain_page(from_height, limit)
     html_template = """    <!doctype html>
 <html>
 <head><meta charset='utf-8'><title>Blockchain History</title>
@@ -66,11 +363,20 @@ def history():
 </tr>
 {% endfor %}
 </table>
+<p>
+{% if from_height > 0 %}<a href="?from_height={{ [from_height - limit, 0]|max }}&limit={{ limit }}">&laquo; Previous</a>{% endif %}
+Blocks {{ from_height }}&ndash;{{ from_height + blocks|length - 1 }} of {{ height }}
+{% if next_from_height is not none %}<a href="?from_height={{ next_from_height }}&limit={{ limit }}">Next &raquo;</a>{% endif %}
+</p>
 </body></html>
 """
     from types import SimpleNamespace
-    blocks_ns = [SimpleNamespace(**b) for b in blocks]
-    return render_template_string(html_template, blocks=blocks_ns)
+    blocks_ns = [SimpleNamespace(**b) for b in page['blocks']]
+    return render_template_string(html_template, blocks=blocks_ns, from_height=from_height, limit=limit,
+                                  height=page['height'], next_from_height=page['next_from_height'])
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # the reloader re-runs this module in a child process, which would open the
+    # store and start a second mining queue (and replicator) next to ours
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), debug=not LEADER_URL,
+            use_reloader=False)
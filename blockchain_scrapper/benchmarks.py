@@ -0,0 +1,325 @@
+"""Offline benchmarks for the blockchain module.
+
+    python benchmarks.py mining --difficulty 4 --workers 4
+    python benchmarks.py batch --records 100
+    python benchmarks.py memory --blocks 100000 1000000
+    python benchmarks.py suite --sizes 1000 100000 1000000 --output results.json
+    python benchmarks.py compare before.json after.json
+"""
+import argparse, gc, hashlib, importlib, json, os, platform, sys, tempfile, time, tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List
+from audit import chain_records, parallel_audit
+from blockchain import Block, Blockchain, now_timestamp
+from chainbin import iter_encoded
+from miner import ProcessPoolMiner, SerialMiner
+from storage import SegmentLog
+
+SAMPLE_RECORD = {
+    'Tên địa điểm': 'Cà phê mẫu',
+    'Địa chỉ': '1 Đường Lê Lợi, Quận 1, TP. Hồ Chí Minh',
+    'Số điện thoại': '028 1234 5678',
+    'Website': 'https://example.com',
+}
+
+
+def sample_block(index: int = 1, data=None) -> Block:
+    return Block(index, now_timestamp(), data or dict(SAMPLE_RECORD), '0' * 64)
+
+
+def bench_mining(difficulty: int, workers: int, blocks: int):
+    miners = [('serial', SerialMiner(), 1)]
+    if workers > 1:
+        miners.append((f'pool[{workers}]', ProcessPoolMiner(workers), min(workers, os.cpu_count() or 1)))
+    for name, miner, cores in miners:
+        attempts = 0
+        start = time.perf_counter()
+        for i in range(blocks):
+            block = sample_block(i + 1)
+            block.nonce, block.hash = miner.mine(block, difficulty)
+            assert block.hash == block.compute_hash()
+            attempts += miner.last_attempts
+        elapsed = time.perf_counter() - start
+        miner.close()
+        rate = attempts / elapsed
+        print(f"{name:>10}: {blocks} blocks @ difficulty {difficulty} in {elapsed:.2f}s, "
+              f"{rate:,.0f} H/s, {rate / cores:,.0f} H/s/core")
+
+
+def bench_batch(difficulty: int, records: int):
+    """Ingest the same records one block each and as a single batch block."""
+    batch = [dict(SAMPLE_RECORD, index=i) for i in range(records)]
+    bc = Blockchain(difficulty=difficulty)
+    start = time.perf_counter()
+    for record in batch:
+        bc.add_block(record)
+    single = time.perf_counter() - start
+    start = time.perf_counter()
+    bc.add_batch(batch)
+    batched = time.perf_counter() - start
+    assert bc.is_chain_valid(full=True)[0]
+    print(f"add_block: {records / single:,.0f} records/s")
+    print(f"add_batch: {records / batched:,.0f} records/s")
+
+
+@dataclass
+class LegacyBlock:
+    """The pre-compaction Block layout, kept only for comparison."""
+    index: int
+    timestamp: float
+    data: Dict[str, Any]
+    previous_hash: str
+    nonce: int = 0
+    hash: str = ""
+
+
+def bench_memory(sizes):
+    """Resident size of a chain held as LegacyBlock vs compact Block objects."""
+    for n in sizes:
+        for name, cls in (('legacy', LegacyBlock), ('compact', Block)):
+            gc.collect()
+            tracemalloc.start()
+            chain = []
+            prev = '0' * 64
+            for i in range(n):
+                digest = hashlib.sha256(str(i).encode()).hexdigest()
+                record = {k: f'{v} #{i}' for k, v in SAMPLE_RECORD.items()}
+                chain.append(cls(i, now_timestamp(), record, prev, i, digest))
+                prev = digest
+            size, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del chain
+            print(f"{name:>8} {n:>9,} blocks: {size / 2 ** 20:8.1f} MiB, {size / n:6.0f} B/block")
+
+
+# ---- JSON suite ----
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {'mean': sum(ordered) / len(ordered), 'p50': pick(0.5), 'p95': pick(0.95), 'p99': pick(0.99),
+            'max': ordered[-1]}
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def suite_mining(difficulties: List[int], blocks: int) -> Dict[str, Any]:
+    miner, out = SerialMiner(), {}
+    for difficulty in difficulties:
+        attempts = 0
+        start = time.perf_counter()
+        for i in range(blocks):
+            block = sample_block(i + 1)
+            block.nonce, block.hash = miner.mine(block, difficulty)
+            attempts += miner.last_attempts
+        elapsed = time.perf_counter() - start
+        out[str(difficulty)] = {'blocks': blocks, 'seconds': elapsed, 'seconds_per_block': elapsed / blocks,
+                                'hashes_per_second': attempts / elapsed}
+    return out
+
+
+def suite_compute_hash(record_sizes: List[int], seconds: float = 0.2) -> Dict[str, Any]:
+    out = {}
+    for size in record_sizes:
+        block = sample_block(data=dict(SAMPLE_RECORD, payload='x' * size))
+        count, start = 0, time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            for _ in range(100):
+                block.compute_hash()
+            count += 100
+        elapsed = time.perf_counter() - start
+        out[str(size)] = {'hashes': count, 'microseconds_per_hash': elapsed / count * 1e6,
+                          'mib_per_second': count * len(block.data_bytes) / elapsed / 2 ** 20}
+    return out
+
+
+def suite_append(blocks: int) -> Dict[str, Any]:
+    """add_block latency at difficulty 0, so persistence dominates."""
+    out = {}
+    for fsync in (True, False):
+        with tempfile.TemporaryDirectory() as directory:
+            bc = Blockchain.open(directory, difficulty=0, fsync=fsync)
+            latencies = []
+            for i in range(blocks):
+                start = time.perf_counter()
+                bc.add_block(dict(SAMPLE_RECORD, index=i))
+                latencies.append(time.perf_counter() - start)
+            bc.storage.close()
+        out['fsync' if fsync else 'no_fsync'] = dict(percentiles(latencies), blocks=blocks,
+                                                       blocks_per_second=blocks / sum(latencies))
+    return out
+
+
+def build_store(directory: str, blocks: int, batch: int = 10000):
+    """Write a valid difficulty-0 chain of ``blocks`` blocks straight into a segment store."""
+    storage = SegmentLog(directory, fsync=False)
+    genesis = Block(0, now_timestamp(), {'note': 'genesis block'}, '0')
+    genesis.hash = genesis.compute_hash()
+    pending, prev = [genesis.to_record()], genesis.hash
+    for i in range(1, blocks):
+        block = Block(i, now_timestamp(), {k: f'{v} #{i}' for k, v in SAMPLE_RECORD.items()}, prev)
+        block.hash = prev = block.compute_hash()
+        pending.append(block.to_record())
+        if len(pending) == batch:
+            storage.append_many(pending)
+            pending = []
+    if pending:
+        storage.append_many(pending)
+    storage.close()
+
+
+def render_chain(bc) -> int:
+    # the work behind GET /chain (compact JSON array of to_dict blocks)
+    size = 0
+    for b in bc.iter_blocks():
+        size += len(json.dumps(b.to_dict(), ensure_ascii=False)) + 1
+    return size
+
+
+def suite_chain(blocks: int, workers: int, eager_limit: int) -> Dict[str, Any]:
+    out: Dict[str, Any] = {'blocks': blocks}
+    with tempfile.TemporaryDirectory() as directory:
+        _, out['build_seconds'] = timed(build_store, directory, blocks)
+        bc, out['open_lazy_seconds'] = timed(Blockchain.open, directory, difficulty=0, lazy=True, fsync=False)
+        _, out['index_ready_seconds'] = timed(bc.index.ready.wait)
+        out['index_ready_seconds'] += out['open_lazy_seconds']
+        (valid, _), seconds = timed(bc.is_chain_valid, full=True)
+        assert valid
+        out['validate'] = {'seconds': seconds, 'blocks_per_second': blocks / seconds}
+        if workers > 1:
+            report, seconds = timed(parallel_audit, chain_records(bc), 0, workers)
+            assert report['valid']
+            out['audit'] = {'workers': workers, 'seconds': seconds, 'blocks_per_second': blocks / seconds}
+        size, seconds = timed(render_chain, bc)
+        out['chain_json'] = {'seconds': seconds, 'bytes': size, 'mib_per_second': size / seconds / 2 ** 20}
+        size, seconds = timed(lambda: sum(len(chunk) for chunk in bc.iter_json()))
+        out['download_json'] = {'seconds': seconds, 'bytes': size, 'mib_per_second': size / seconds / 2 ** 20}
+        size, seconds = timed(lambda: sum(len(chunk) for chunk in iter_encoded(bc.iter_blocks())))
+        out['download_bin'] = {'seconds': seconds, 'bytes': size, 'mib_per_second': size / seconds / 2 ** 20}
+        _, out['page_seconds'] = timed(lambda: [b.to_dict() for b in bc.iter_blocks(blocks // 2, 100)])
+        bc.storage.close()
+        if blocks <= eager_limit:
+            bc, out['open_eager_seconds'] = timed(Blockchain.open, directory, difficulty=0, fsync=False)
+            bc.storage.close()
+    return out
+
+
+def suite_api(requests_count: int, difficulty: int) -> Dict[str, Any]:
+    """POST /add through Flask's test client against a throwaway store."""
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update(CHAIN_STORE=directory, MINER_WORKERS='1', CHAIN_DIFFICULTY=str(difficulty),
+                          ARCHIVE_KEEP_SEGMENTS='off')
+        os.environ.pop('LEADER_URL', None)
+        app_module = importlib.import_module('app_blockchain')
+        client = app_module.app.test_client()
+        statuses, tickets = {}, []
+        start = time.perf_counter()
+        for i in range(requests_count):
+            response = client.post('/add', json=dict(SAMPLE_RECORD, index=i))
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 202:
+                tickets.append(response.get_json()['ticket'])
+        accepted = time.perf_counter() - start
+        for ticket in tickets:
+            app_module.mining_queue.get(ticket, wait=60)
+        mined = time.perf_counter() - start
+        blocks = len(app_module.bc.chain) - 1
+        app_module.bc.storage.close()
+    return {'requests': requests_count, 'difficulty': difficulty, 'statuses': {str(k): v for k, v in statuses.items()},
+            'requests_per_second': requests_count / accepted, 'records_mined_per_second': len(tickets) / mined,
+            'blocks_mined': blocks}
+
+
+def run_suite(args) -> Dict[str, Any]:
+    results: Dict[str, Any] = {
+        'meta': {'started': datetime.now().isoformat(), 'python': sys.version.split()[0],
+                 'platform': platform.platform(), 'cpu_count': os.cpu_count(), 'args': vars(args)},
+    }
+    steps = [
+        ('mining', lambda: suite_mining(args.difficulties, args.mining_blocks)),
+        ('compute_hash', lambda: suite_compute_hash(args.record_sizes)),
+        ('append', lambda: suite_append(args.append_blocks)),
+        ('chain', lambda: {str(n): suite_chain(n, args.workers, args.eager_limit) for n in args.sizes}),
+        ('api', lambda: suite_api(args.api_requests, args.api_difficulty)),
+    ]
+    for name, step in steps:
+        if args.only and name not in args.only:
+            continue
+        print(f'running {name} ...', file=sys.stderr)
+        results[name] = step()
+    return results
+
+
+def flatten(value, prefix=''):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten(item, f'{prefix}.{key}' if prefix else key)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def compare(before_path: str, after_path: str):
+    """Print every numeric metric present in both runs with its after/before ratio."""
+    with open(before_path, encoding='utf-8') as f:
+        before = dict(flatten({k: v for k, v in json.load(f).items() if k != 'meta'}))
+    with open(after_path, encoding='utf-8') as f:
+        after = dict(flatten({k: v for k, v in json.load(f).items() if k != 'meta'}))
+    for key in sorted(before.keys() & after.keys()):
+        ratio = after[key] / before[key] if before[key] else float('nan')
+        print(f'{key:<60} {before[key]:>14.6g} {after[key]:>14.6g} {ratio:>8.2f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    mining = sub.add_parser('mining', help='proof-of-work hash rate per core')
+    mining.add_argument('--difficulty', type=int, default=4)
+    mining.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    mining.add_argument('--blocks', type=int, default=5)
+    batch = sub.add_parser('batch', help='records/s through add_block vs add_batch')
+    batch.add_argument('--difficulty', type=int, default=3)
+    batch.add_argument('--records', type=int, default=100)
+    memory = sub.add_parser('memory', help='chain memory, legacy dataclass vs compact blocks')
+    memory.add_argument('--blocks', type=int, nargs='+', default=[100000, 1000000])
+    suite = sub.add_parser('suite', help='everything, as JSON')
+    suite.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000],
+                       help='chain lengths for load/validate/serialize')
+    suite.add_argument('--difficulties', type=int, nargs='+', default=[1, 2, 3, 4])
+    suite.add_argument('--mining-blocks', type=int, default=5)
+    suite.add_argument('--record-sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000],
+                       help='payload bytes per record for compute_hash')
+    suite.add_argument('--append-blocks', type=int, default=500)
+    suite.add_argument('--api-requests', type=int, default=500)
+    suite.add_argument('--api-difficulty', type=int, default=2)
+    suite.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='parallel audit workers')
+    suite.add_argument('--eager-limit', type=int, default=100000, help='largest chain also opened eagerly')
+    suite.add_argument('--only', nargs='+', choices=['mining', 'compute_hash', 'append', 'chain', 'api'])
+    suite.add_argument('--output', help='write the JSON here instead of stdout')
+    cmp = sub.add_parser('compare', help='ratios between two suite results')
+    cmp.add_argument('before')
+    cmp.add_argument('after')
+    args = parser.parse_args()
+    if args.command == 'mining':
+        bench_mining(args.difficulty, args.workers, args.blocks)
+    elif args.command == 'batch':
+        bench_batch(args.difficulty, args.records)
+    elif args.command == 'memory':
+        bench_memory(args.blocks)
+    elif args.command == 'suite':
+        results = json.dumps(run_suite(args), indent=2, ensure_ascii=False)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(results + '\n')
+        else:
+            print(results)
+    elif args.command == 'compare':
+        compare(args.before, args.after)
+
+
+if __name__ == '__main__':
+    main()
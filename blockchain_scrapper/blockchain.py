@@ -1,103 +1,618 @@
-from dataclasses import dataclass, asdict
-from typing import List, Dict, Any
-import hashlib, json, time
+from typing import List, Dict, Any, Iterator, Optional, Sequence, Tuple
+import hashlib, itertools, json, os, threading, time
+from collections import OrderedDict
 from datetime import datetime
+from index import HEIGHT_MASK, ChainIndex, RecordIndex, block_records, canonical_record, check_batch_records, is_batch
+from metrics import MiningMetrics
+from sqlite_storage import SQLiteLog
+from storage import SegmentLog, atomic_write
+
+
+def now_timestamp() -> float:
+    # Rounded to microseconds so the ISO timestamp in JSON exports parses
+    # back to the exact float that was hashed.
+    return round(time.time(), 6)
+
+def encode_data(data: Dict[str, Any]) -> bytes:
+    return json.dumps(data, sort_keys=True, ensure_ascii=False).encode('utf-8')
+
+def pack_digest(value: str):
+    # 64 lowercase hex chars -> 32 raw bytes; anything else ("0", "") stays a str
+    if len(value) == 64 and value == value.lower():
+        try:
+            return bytes.fromhex(value)
+        except ValueError:
+            pass
+    return value
+
+def unpack_digest(value) -> str:
+    return value.hex() if isinstance(value, bytes) else value
 
-@dataclass
 class Block:
-    index: int
-    timestamp: float
-    data: Dict[str, Any]
-    previous_hash: str
-    nonce: int = 0
-    hash: str = ""
+    """A block kept compact for long chains.
+
+    Hashes are held as raw 32-byte digests and ``data`` as its canonical
+    JSON bytes, decoded on each access. Reading ``block.data`` returns a
+    fresh dict; assign to ``block.data`` to change it.
+
+    ``difficulty`` is the proof-of-work difficulty the block was mined at.
+    Blocks from before it was recorded leave it as None and hash exactly
+    as they did then.
+    """
+    __slots__ = ('index', 'timestamp', 'nonce', 'difficulty', '_data', '_previous_hash', '_hash')
+
+    def __init__(self, index: int, timestamp: float, data: Dict[str, Any], previous_hash: str,
+                 nonce: int = 0, hash: str = "", difficulty: Optional[int] = None):
+        self.index = index
+        self.timestamp = timestamp
+        self.data = data
+        self.previous_hash = previous_hash
+        self.nonce = nonce
+        self.hash = hash
+        self.difficulty = difficulty
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        return json.loads(self._data)
+
+    @data.setter
+    def data(self, value: Dict[str, Any]):
+        self._data = encode_data(value)
+
+    @property
+    def data_bytes(self) -> bytes:
+        return self._data
+
+    def packed_hashes(self):
+        # (hash, previous_hash) as stored: 32 raw bytes, or a str such as the genesis "0"
+        return self._hash, self._previous_hash
+
+    @property
+    def hash(self) -> str:
+        return unpack_digest(self._hash)
+
+    @hash.setter
+    def hash(self, value: str):
+        self._hash = pack_digest(value)
+
+    @property
+    def previous_hash(self) -> str:
+        return unpack_digest(self._previous_hash)
+
+    @previous_hash.setter
+    def previous_hash(self, value: str):
+        self._previous_hash = pack_digest(value)
+
+    def __repr__(self):
+        return (f'Block(index={self.index!r}, timestamp={self.timestamp!r}, previous_hash={self.previous_hash!r}, '
+                f'nonce={self.nonce!r}, difficulty={self.difficulty!r}, hash={self.hash!r})')
 
     def compute_hash(self) -> str:
-        block_string = json.dumps({
-            "index": self.index,
-            "timestamp": self.timestamp,
-            "data": self.data,
-            "previous_hash": self.previous_hash,
-            "nonce": self.nonce
-        }, sort_keys=True, ensure_ascii=False).encode('utf-8')
-        return hashlib.sha256(block_string).hexdigest()
+        # sha256 of json.dumps({index, timestamp, data, previous_hash, nonce[, difficulty]},
+        # sort_keys=True, ensure_ascii=False), assembled from hash_parts()
+        prefix, suffix = self.hash_parts()
+        return hashlib.sha256(prefix + str(self.nonce).encode('ascii') + suffix).hexdigest()
+
+    def hash_parts(self):
+        """Canonical JSON of compute_hash() split around the nonce value.
+
+        Keys are sorted, so the encoding is ``prefix + str(nonce) + suffix``
+        where only the nonce changes between proof-of-work attempts.
+        """
+        enc = lambda v: json.dumps(v, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        prefix = b'{"data": ' + self._data
+        if self.difficulty is not None:
+            prefix += b', "difficulty": ' + enc(self.difficulty)
+        prefix += b', "index": ' + enc(self.index) + b', "nonce": '
+        suffix = b', "previous_hash": ' + enc(self.previous_hash) + b', "timestamp": ' + enc(self.timestamp) + b'}'
+        return prefix, suffix
 
     def to_dict(self):
-        d = asdict(self)
+        d = self.to_record()
         d['timestamp'] = datetime.fromtimestamp(self.timestamp).isoformat()
         return d
 
+    def to_record(self):
+        # storage form: keeps the raw float timestamp that was hashed
+        record = {
+            'index': self.index,
+            'timestamp': self.timestamp,
+            'data': self.data,
+            'previous_hash': self.previous_hash,
+            'nonce': self.nonce,
+            'hash': self.hash,
+        }
+        if self.difficulty is not None:
+            record['difficulty'] = self.difficulty
+        return record
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> 'Block':
+        return cls(**record)
+
+    @classmethod
+    def from_encoded(cls, index: int, timestamp: float, data_bytes: bytes, previous_hash, nonce: int, hash,
+                     difficulty: Optional[int] = None) -> 'Block':
+        """Build a block from its canonical data bytes and packed digests without re-encoding."""
+        block = cls.__new__(cls)
+        block.index, block.timestamp, block.nonce, block.difficulty = index, timestamp, nonce, difficulty
+        block._data, block._previous_hash, block._hash = data_bytes, previous_hash, hash
+        return block
+
+    @classmethod
+    def from_dict(cls, item: Dict[str, Any]) -> 'Block':
+        return cls(
+            index=item['index'],
+            timestamp=datetime.fromisoformat(item['timestamp']).timestamp(),
+            data=item['data'],
+            previous_hash=item['previous_hash'],
+            nonce=item.get('nonce', 0),
+            hash=item.get('hash', ""),
+            difficulty=item.get('difficulty')
+        )
+
+def merkle_root(records: List[Dict[str, Any]]) -> str:
+    """Merkle root over the canonical JSON of each record (odd levels repeat the last node)."""
+    level = [hashlib.sha256(json.dumps(r, sort_keys=True, ensure_ascii=False).encode('utf-8')).digest()
+             for r in records]
+    if not level:
+        return hashlib.sha256(b'').hexdigest()
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [hashlib.sha256(level[i] + level[i + 1]).digest() for i in range(0, len(level), 2)]
+    return level[0].hex()
+
+def check_block(block: Block, prev_hash: str, difficulty: int) -> Optional[str]:
+    """Why ``block`` is invalid after a block hashed ``prev_hash``, or None.
+
+    ``difficulty`` is the chain's minimum: blocks that record their own
+    difficulty must meet that (and it may not be lower), older blocks
+    must meet the minimum.
+    """
+    if block.hash != block.compute_hash():
+        return f'Invalid hash at index {block.index}'
+    if block.previous_hash != prev_hash:
+        return f'Invalid previous_hash at index {block.index}'
+    if block.difficulty is not None and block.difficulty < difficulty:
+        return f'Difficulty below minimum at index {block.index}'
+    if not block.hash.startswith('0' * (difficulty if block.difficulty is None else block.difficulty)):
+        return f'Proof-of-work not satisfied at index {block.index}'
+    data = block.data
+    if is_batch(data):
+        try:
+            check_batch_records(data['records'])
+        except ValueError:
+            return f'Invalid batch records at index {block.index}'
+        if data['merkle_root'] != merkle_root(data['records']):
+            return f'Invalid merkle_root at index {block.index}'
+    return None
+
+class HashTemplate:
+    """SHA-256 state primed with everything before the nonce, so each
+    attempt only hashes the nonce digits and the short suffix."""
+
+    def __init__(self, prefix: bytes, suffix: bytes):
+        self._state = hashlib.sha256(prefix)
+        self._suffix = suffix
+
+    @classmethod
+    def for_block(cls, block: Block) -> 'HashTemplate':
+        return cls(*block.hash_parts())
+
+    def hexdigest(self, nonce: int) -> str:
+        h = self._state.copy()
+        h.update(str(nonce).encode('ascii') + self._suffix)
+        return h.hexdigest()
+
+class LazyChain:
+    """List-like view of the blocks in a SegmentLog.
+
+    Blocks are decoded from storage when indexed and kept in a small LRU
+    cache, so opening a long chain materializes only the tip. Appends must
+    already be persisted; ``append`` only caches the new block.
+    """
+
+    def __init__(self, storage: SegmentLog, cache_size: int = 4096):
+        self.storage = storage
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[int, Block]' = OrderedDict()
+        self._lock = threading.Lock()
+        if len(storage):
+            self[-1]
+
+    def __len__(self):
+        return len(self.storage)
+
+    def _cached(self, height: int) -> Block:
+        with self._lock:
+            block = self._cache.get(height)
+            if block is not None:
+                self._cache.move_to_end(height)
+                return block
+        block = Block.from_record(self.storage.read(height))
+        self._remember(block)
+        return block
+
+    def _remember(self, block: Block):
+        with self._lock:
+            self._cache[block.index] = block
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self._cached(i) for i in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('chain index out of range')
+        return self._cached(key)
+
+    def __iter__(self) -> Iterator[Block]:
+        return self.iter_from(0)
+
+    def iter_from(self, height: int) -> Iterator[Block]:
+        # sequential scans stream straight from storage, bypassing the cache
+        for record in self.storage.iter_from(height):
+            yield Block.from_record(record)
+
+    def __reversed__(self) -> Iterator[Block]:
+        for i in range(len(self) - 1, -1, -1):
+            yield Block.from_record(self.storage.read(i))
+
+    def append(self, block: Block):
+        self._remember(block)
+
+    def truncate(self, height: int):
+        # storage is truncated by the caller; only drop cached blocks here
+        with self._lock:
+            for h in [h for h in self._cache if h >= height]:
+                del self._cache[h]
+
 class Blockchain:
-    def __init__(self, difficulty: int = 3):
+    def __init__(self, difficulty: int = 3, storage: Optional[SegmentLog | SQLiteLog] = None, miner=None,
+                 index_fields: Sequence[str] = (), lazy: bool = False, controller=None, dedup: bool = False):
         self.chain: List[Block] = []
+        # minimum proof-of-work difficulty; new blocks record the one they were mined at
         self.difficulty = difficulty
+        self.storage = storage
+        # any object with mine(block, difficulty) -> (nonce, hash), see miner.py
+        self.miner = miner
+        # optional difficulty.DifficultyController retargeting above the minimum
+        self.controller = controller
+        self.metrics = MiningMetrics()
+        # seconds lookups wait for a background index rebuild before raising IndexUnavailable
+        self.index_wait = 30.0
+        # serializes appends and rollbacks (mining itself runs outside it)
+        self.write_lock = threading.RLock()
+        # highest height already verified, with the block hash seen there
+        self.verified_height = 0
+        self.verified_hash: Optional[str] = None
+        if storage is not None and lazy:
+            # blocks are decoded from the log on demand; only the tip is read now
+            self.chain = LazyChain(storage)
+        elif storage is not None and len(storage):
+            self.chain = [Block.from_record(r) for r in storage]
+        if storage is not None and len(storage):
+            checkpoint = storage.load_meta('checkpoint') or {}
+            self.verified_height = checkpoint.get('height', 0)
+            self.verified_hash = checkpoint.get('hash')
         self.create_genesis_block()
+        if controller is not None:
+            controller.resume(self.last_block.difficulty)
+        self.index = ChainIndex(index_fields)
+        # content hashes of every record, for find_record (opt-in no-duplicates mode)
+        self.records = RecordIndex() if dedup else None
+        if lazy:
+            # newest blocks first, so recent hashes resolve early
+            self.index.rebuild_async(reversed(self.chain))
+            if self.records is not None:
+                self.records.rebuild_async(iter(self.chain))
+        else:
+            self.index.rebuild(self.chain)
+            if self.records is not None:
+                self.records.rebuild(self.chain)
 
     def create_genesis_block(self):
         if self.chain:
             return
-        genesis = Block(0, time.time(), {"note": "genesis block"}, "0")
+        genesis = Block(0, now_timestamp(), {"note": "genesis block"}, "0")
         genesis.hash = genesis.compute_hash()
         self.chain.append(genesis)
+        self._persist([genesis])
+
+    def _persist(self, blocks: List[Block]):
+        if self.storage is not None:
+            self.storage.append_many([b.to_record() for b in blocks])
+
+    def attach_storage(self, storage: SegmentLog | SQLiteLog):
+        """Start persisting to ``storage``, copying the current chain into it if it is empty."""
+        if len(storage) == 0:
+            storage.append_many([b.to_record() for b in self.chain])
+        self.storage = storage
+
+    @classmethod
+    def open(cls, directory: str, difficulty: int = 3, import_path: Optional[str] = None, miner=None,
+             index_fields: Sequence[str] = (), lazy: bool = False, backend: str = 'segments', controller=None,
+             dedup: bool = False, **storage_opts):
+        """Open (or create) a chain persisted under ``directory``.
+
+        ``backend`` is 'segments' (append-only segment log) or 'sqlite'
+        (chain.sqlite3 in the same directory). If the store is empty and
+        ``import_path`` points at a legacy JSON export (or a binary one
+        from save()), that chain is imported first. With ``lazy`` the chain is served from storage on
+        demand instead of being decoded into memory up front.
+        """
+        if backend == 'sqlite':
+            storage = SQLiteLog(os.path.join(directory, 'chain.sqlite3'), **storage_opts)
+        else:
+            storage = SegmentLog(directory, **storage_opts)
+        if len(storage) == 0 and import_path and os.path.exists(import_path):
+            from chainbin import is_chain_file
+            loader = cls.load if is_chain_file(import_path) else cls.load_from_file
+            bc = loader(import_path, difficulty=difficulty, miner=miner, index_fields=index_fields,
+                        controller=controller, dedup=dedup)
+            bc.attach_storage(storage)
+            return bc
+        return cls(difficulty=difficulty, storage=storage, miner=miner, index_fields=index_fields, lazy=lazy,
+                   controller=controller, dedup=dedup)
 
     @property
     def last_block(self) -> Block:
         return self.chain[-1]
 
+    def next_difficulty(self) -> int:
+        return self.controller.difficulty if self.controller is not None else self.difficulty
+
     def proof_of_work(self, block: Block) -> str:
-        target = '0' * self.difficulty
+        difficulty = self.difficulty if block.difficulty is None else block.difficulty
+        if self.miner is not None:
+            block.nonce, computed = self.miner.mine(block, difficulty)
+            return computed
+        target = '0' * difficulty
+        template = HashTemplate.for_block(block)
         while True:
-            computed = block.compute_hash()
+            computed = template.hexdigest(block.nonce)
             if computed.startswith(target):
                 return computed
             block.nonce += 1
 
+    def add_batch(self, records: List[Dict[str, Any]]) -> Block:
+        """Store many records in one block whose data commits to their Merkle root."""
+        check_batch_records(records)
+        return self._mine({'merkle_root': merkle_root(records), 'records': list(records)})
+
     def add_block(self, data: Dict[str, Any]) -> Block:
+        if not isinstance(data, dict):
+            raise ValueError('Block data must be an object')
+        if set(data) == {'merkle_root', 'records'}:
+            raise ValueError("A record with exactly 'merkle_root' and 'records' looks like a batch; use add_batch")
+        return self._mine(data)
+
+    def _prepare(self, blocks: List[Block]) -> int:
+        """Checks that could fail after persisting, done before it; returns the number of records."""
+        if self.records is not None and blocks and blocks[-1].index > HEIGHT_MASK:
+            raise OverflowError('RecordIndex holds heights below 2**28')
+        return sum(len(block_records(b.data)) for b in blocks)
+
+    def _mine(self, data: Dict[str, Any]) -> Block:
         new_block = Block(
             index=self.last_block.index + 1,
-            timestamp=time.time(),
+            timestamp=now_timestamp(),
             data=data,
-            previous_hash=self.last_block.hash
+            previous_hash=self.last_block.hash,
+            difficulty=self.next_difficulty()
         )
+        start = time.perf_counter()
         new_block.hash = self.proof_of_work(new_block)
-        self.chain.append(new_block)
+        elapsed = time.perf_counter() - start
+        self.metrics.observe_mining(elapsed, getattr(self.miner, 'last_attempts', new_block.nonce + 1),
+                                    new_block.difficulty)
+        if self.controller is not None:
+            self.controller.observe(elapsed, new_block.difficulty)
+        with self.write_lock:
+            if self.last_block.hash != new_block.previous_hash:
+                raise RuntimeError('Chain tip moved while mining; block discarded')
+            records = self._prepare([new_block])
+            self._persist([new_block])
+            self.chain.append(new_block)
+            self._index_block(new_block)
+        self.metrics.observe_append(1, records)
         return new_block
 
-    def is_chain_valid(self):
-        target = '0' * self.difficulty
-        for i in range(1, len(self.chain)):
-            current = self.chain[i]
-            prev = self.chain[i - 1]
-            if current.hash != current.compute_hash():
-                return False, f'Invalid hash at index {current.index}'
-            if current.previous_hash != prev.hash:
-                return False, f'Invalid previous_hash at index {current.index}'
-            if not current.hash.startswith(target):
-                return False, f'Proof-of-work not satisfied at index {current.index}'
+    def append_blocks(self, blocks: List[Block]) -> int:
+        """Append already-mined blocks (e.g. from a peer) after checking each one."""
+        return self.replace_from(len(self.chain), blocks)
+
+    def replace_from(self, height: int, blocks: List[Block]) -> int:
+        """Swap the blocks from ``height`` on for ``blocks``, which must link to block ``height - 1``.
+
+        Only the incoming blocks are checked, and nothing is dropped unless
+        all of them pass; an empty ``blocks`` just truncates. ``height`` 0 replaces the genesis block too
+        (nodes mint their own), which is then trusted like any genesis.
+        """
+        with self.write_lock:
+            if not 0 <= height <= len(self.chain):
+                raise ValueError(f'Height {height} is beyond the tip')
+            prev_hash = self.chain[height - 1].hash if height else None
+            expected = height
+            for b in blocks:
+                if b.index != expected:
+                    error = f'Unexpected index {b.index}, expected {expected}'
+                elif prev_hash is None:
+                    error = None if b.hash == b.compute_hash() else 'Invalid genesis block'
+                else:
+                    error = check_block(b, prev_hash, self.difficulty)
+                if error:
+                    raise ValueError(error)
+                prev_hash = b.hash
+                expected += 1
+            if height == 0 and not blocks:
+                raise ValueError('Cannot drop the genesis block')
+            # extending a verified tip keeps the checkpoint moving with it
+            extends_checkpoint = blocks and height > 0 and self.verified_height == height - 1 and \
+                self.verified_hash == self.chain[height - 1].hash
+            records = self._prepare(blocks)
+            self._truncate(height)
+            self._persist(blocks)
+            for b in blocks:
+                self.chain.append(b)
+                self._index_block(b)
+            if extends_checkpoint:
+                self.mark_verified(blocks[-1].index, blocks[-1].hash)
+        self.metrics.observe_append(len(blocks), records)
+        return len(blocks)
+
+    def _truncate(self, height: int):
+        if height >= len(self.chain):
+            return
+        if self.storage is not None:
+            self.storage.truncate(height)
+        if isinstance(self.chain, LazyChain):
+            self.chain.truncate(height)
+        else:
+            del self.chain[height:]
+        self.index.truncate(height)
+        if self.records is not None:
+            self.records.truncate(height)
+
+    def _index_block(self, block: Block):
+        self.index.add(block)
+        if self.records is not None:
+            self.records.add(block)
+
+    def _checkpoint_start(self) -> int:
+        h = self.verified_height
+        if 0 < h < len(self.chain) and self.chain[h].hash == self.verified_hash:
+            return h + 1
+        # unknown or stale checkpoint (tip hash moved): start over
+        self.verified_height, self.verified_hash = 0, None
+        return 1
+
+    def mark_verified(self, height: int, block_hash: str):
+        """Persist ``height`` (whose block hashes to ``block_hash``) as the verified checkpoint."""
+        self.verified_height = height
+        self.verified_hash = block_hash
+        if self.storage is not None:
+            self.storage.save_meta('checkpoint', {'height': self.verified_height, 'hash': self.verified_hash})
+
+    def is_chain_valid(self, full: bool = False):
+        """Validate blocks after the verified-height checkpoint, or all of them when ``full``."""
+        start = 1 if full else self._checkpoint_start()
+        height = len(self.chain)
+        prev_hash = None
+        # streamed from start - 1 so lazy/SQLite chains are read sequentially
+        for current in self.iter_blocks(start - 1, height - start + 1):
+            if prev_hash is not None:
+                error = check_block(current, prev_hash, self.difficulty)
+                if error:
+                    return False, error
+            prev_hash = current.hash
+        if prev_hash is not None and (start < height or self.verified_hash != prev_hash):
+            self.mark_verified(height - 1, prev_hash)
         return True, 'Chain is valid'
 
     def to_list(self):
         return [b.to_dict() for b in self.chain]
 
+    def height_of(self, block_hash: str) -> Optional[int]:
+        """Height of the block with ``block_hash``, or None if there is none.
+
+        While the index is rebuilding, storage that keeps its own hash index
+        answers instead; otherwise this waits up to ``index_wait`` seconds and
+        raises IndexUnavailable rather than scanning the whole chain.
+        """
+        height = self.index.height_of(block_hash)
+        if height is None and (not self.index.ready.is_set() or self.index.error is not None):
+            if hasattr(self.storage, 'height_of'):
+                return self.storage.height_of(block_hash)
+            self.index.wait(self.index_wait)
+            height = self.index.height_of(block_hash)
+        return height
+
+    def get_block(self, height: int) -> Optional[Block]:
+        return self.chain[height] if 0 <= height < len(self.chain) else None
+
+    def find_blocks(self, field: str, value: Any) -> List[Block]:
+        """Blocks holding a record with ``field`` == ``value`` (field must be indexed).
+
+        Raises IndexUnavailable if the index is not ready within ``index_wait`` seconds.
+        """
+        self.index.wait(self.index_wait)
+        return [self.chain[h] for h in self.index.search(field, value)]
+
+    def find_record(self, record: Dict[str, Any]) -> Optional[Tuple[Block, Optional[int]]]:
+        """(block, position in its batch or None) of the first block holding ``record``.
+
+        Only available with ``dedup``; waits up to ``index_wait`` seconds for the
+        record index to be built, then raises IndexUnavailable.
+        """
+        if self.records is None:
+            return None
+        self.records.wait(self.index_wait)
+        encoded = canonical_record(record)
+        for height in self.records.candidates(encoded):
+            block = self.get_block(height)
+            if block is None:
+                continue
+            data = block.data
+            if not is_batch(data):
+                if canonical_record(data) == encoded:
+                    return block, None
+                continue
+            for position, stored in enumerate(data['records']):
+                if canonical_record(stored) == encoded:
+                    return block, position
+        return None
+
+    def iter_blocks(self, from_height: int = 0, limit: Optional[int] = None) -> Iterator[Block]:
+        from_height = max(from_height, 0)
+        if isinstance(self.chain, LazyChain):
+            yield from itertools.islice(self.chain.iter_from(from_height), limit)
+            return
+        height = len(self.chain)
+        stop = height if limit is None else min(height, from_height + limit)
+        for i in range(from_height, stop):
+            yield self.chain[i]
+
+    def iter_json(self, limit: Optional[int] = None):
+        # Same bytes as json.dump(self.to_list(), indent=2), one block at a time
+        yield '['
+        count = 0
+        for count, b in enumerate(self.iter_blocks(0, limit), 1):
+            body = json.dumps(b.to_dict(), ensure_ascii=False, indent=2)
+            yield (',\n  ' if count > 1 else '\n  ') + body.replace('\n', '\n  ')
+        yield '\n]' if count else ']'
+
     def save_to_file(self, path: str):
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(self.to_list(), f, ensure_ascii=False, indent=2)
+        atomic_write(path, self.iter_json())
+
+    def save(self, path: str, limit: Optional[int] = None):
+        """Write the chain in the binary format of chainbin.py."""
+        from chainbin import write_chain
+        write_chain(path, self.iter_blocks(0, limit))
+
+    @classmethod
+    def load(cls, path: str, difficulty: int = 3, **kwargs):
+        """Counterpart of save(); blocks keep their exact hashes."""
+        from chainbin import ChainFile
+        bc = cls(difficulty=difficulty, **kwargs)
+        with ChainFile(path) as f:
+            bc.chain = list(f)
+        bc.index.rebuild(bc.chain)
+        if bc.records is not None:
+            bc.records.rebuild(bc.chain)
+        return bc
 
     @classmethod
-    def load_from_file(cls, path: str, difficulty: int = 3):
+    def load_from_file(cls, path: str, difficulty: int = 3, **kwargs):
         with open(path, 'r', encoding='utf-8') as f:
             arr = json.load(f)
-        bc = cls(difficulty=difficulty)
+        bc = cls(difficulty=difficulty, **kwargs)
         # replace genesis with loaded genesis
-        bc.chain = []
-        for item in arr:
-            b = Block(
-                index=item['index'],
-                timestamp=datetime.fromisoformat(item['timestamp']).timestamp(),
-                data=item['data'],
-                previous_hash=item['previous_hash'],
-                nonce=item.get('nonce', 0),
-                hash=item.get('hash', "")
-            )
-            bc.chain.append(b)
+        bc.chain = [Block.from_dict(item) for item in arr]
+        bc.index.rebuild(bc.chain)
+        if bc.records is not None:
+            bc.records.rebuild(bc.chain)
         return bc
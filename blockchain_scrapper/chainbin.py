@@ -0,0 +1,132 @@
+"""Versioned binary chain format.
+
+    header   b'BCHN' uint16 version uint16 flags
+    records  uint32 length + body, one per block in height order
+    index    uint64 offset of each record
+    footer   uint64 count, uint64 index offset, b'BCHNIDX\\0'
+
+A record body is ``<QdQBB`` (index, timestamp, nonce, difficulty or 255,
+digest flags), then the hash and previous hash (32 raw bytes, or a uint16
+length and UTF-8 text such as the genesis "0"), then the block's canonical
+data JSON bytes. The timestamp is stored as the exact float that was hashed,
+so every block round-trips to the same hash. Little-endian throughout.
+"""
+import mmap, struct
+from array import array
+from typing import Iterable, Iterator, Union
+from blockchain import Block
+from storage import atomic_write
+
+MAGIC = b'BCHN'
+FOOTER_MAGIC = b'BCHNIDX\0'
+VERSION = 1
+HEADER = struct.Struct('<4sHH')
+LENGTH = struct.Struct('<I')
+FIXED = struct.Struct('<QdQBB')
+FOOTER = struct.Struct('<QQ8s')
+TEXT_LENGTH = struct.Struct('<H')
+NO_DIFFICULTY = 255
+RAW_HASH, RAW_PREVIOUS_HASH = 1, 2
+
+
+def _digest(value: Union[bytes, str]) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    text = value.encode('utf-8')
+    return TEXT_LENGTH.pack(len(text)) + text
+
+
+def encode_block(block: Block) -> bytes:
+    hash_, prev = block.packed_hashes()
+    flags = (RAW_HASH if isinstance(hash_, bytes) else 0) | (RAW_PREVIOUS_HASH if isinstance(prev, bytes) else 0)
+    difficulty = NO_DIFFICULTY if block.difficulty is None else block.difficulty
+    body = FIXED.pack(block.index, block.timestamp, block.nonce, difficulty, flags) + \
+        _digest(hash_) + _digest(prev) + block.data_bytes
+    return LENGTH.pack(len(body)) + body
+
+
+def decode_block(body: bytes) -> Block:
+    index, timestamp, nonce, difficulty, flags = FIXED.unpack_from(body)
+    pos = FIXED.size
+    digests = []
+    for raw in (flags & RAW_HASH, flags & RAW_PREVIOUS_HASH):
+        if raw:
+            digests.append(bytes(body[pos:pos + 32]))
+            pos += 32
+        else:
+            (length,) = TEXT_LENGTH.unpack_from(body, pos)
+            digests.append(bytes(body[pos + 2:pos + 2 + length]).decode('utf-8'))
+            pos += 2 + length
+    return Block.from_encoded(index, timestamp, bytes(body[pos:]), digests[1], nonce, digests[0],
+                              None if difficulty == NO_DIFFICULTY else difficulty)
+
+
+def iter_encoded(blocks: Iterable[Block]) -> Iterator[bytes]:
+    """The file as a stream of byte chunks (what /download?format=bin sends)."""
+    offsets = array('Q')
+    pos = HEADER.size
+    yield HEADER.pack(MAGIC, VERSION, 0)
+    for block in blocks:
+        record = encode_block(block)
+        offsets.append(pos)
+        pos += len(record)
+        yield record
+    yield offsets.tobytes()
+    yield FOOTER.pack(len(offsets), pos, FOOTER_MAGIC)
+
+
+def write_chain(path: str, blocks: Iterable[Block]):
+    atomic_write(path, iter_encoded(blocks), binary=True)
+
+
+def is_chain_file(path: str) -> bool:
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class ChainFile:
+    """Random access to a binary chain file through a memory map."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _ = HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a binary chain file')
+        if version != VERSION:
+            raise ValueError(f'{path} has format version {version}, expected {VERSION}')
+        count, index_offset, footer_magic = FOOTER.unpack_from(self._mm, len(self._mm) - FOOTER.size)
+        if footer_magic != FOOTER_MAGIC or index_offset + count * 8 + FOOTER.size != len(self._mm):
+            raise ValueError(f'{path} is truncated or corrupt')
+        self.offsets = array('Q')
+        self.offsets.frombytes(self._mm[index_offset:index_offset + count * 8])
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def read(self, height: int) -> Block:
+        if not 0 <= height < len(self.offsets):
+            raise IndexError(height)
+        start = self.offsets[height]
+        (length,) = LENGTH.unpack_from(self._mm, start)
+        return decode_block(memoryview(self._mm)[start + LENGTH.size:start + LENGTH.size + length])
+
+    def __getitem__(self, height: int) -> Block:
+        return self.read(height + len(self) if height < 0 else height)
+
+    def __iter__(self) -> Iterator[Block]:
+        for height in range(len(self.offsets)):
+            yield self.read(height)
+
+    def close(self):
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,67 @@
+import statistics, threading
+from collections import deque
+from typing import Optional
+
+# one more leading hex zero is 16x the expected work
+WORK_FACTOR = 16
+
+
+class DifficultyController:
+    """Retargets proof-of-work difficulty toward ``target_seconds`` per block.
+
+    Blocks here are mined on demand, so the observed block time is the time
+    spent in proof-of-work rather than the gap between blocks. After
+    ``window`` blocks at one difficulty, the median mining time is compared
+    with the target: below target / 4 one step up is closer to it, above
+    target * 4 one step down is (each step is 16x the work). The result
+    stays within [min_difficulty, max_difficulty]; ``min_difficulty`` is the
+    chain's own difficulty, which validation enforces.
+    """
+
+    def __init__(self, target_seconds: float, min_difficulty: int = 3, max_difficulty: int = 6,
+                 window: int = 5, difficulty: Optional[int] = None):
+        self.target_seconds = target_seconds
+        self.min_difficulty = min_difficulty
+        self.max_difficulty = max_difficulty
+        self.window = window
+        self.difficulty = self._clamp(min_difficulty if difficulty is None else difficulty)
+        self.retargets = 0
+        self._times: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def _clamp(self, difficulty: int) -> int:
+        return max(self.min_difficulty, min(self.max_difficulty, difficulty))
+
+    def resume(self, difficulty: Optional[int]):
+        """Continue from the difficulty recorded in the chain tip after a restart."""
+        if difficulty is not None:
+            with self._lock:
+                self.difficulty = self._clamp(difficulty)
+                self._times.clear()
+
+    def observe(self, seconds: float, difficulty: int) -> int:
+        """Record a block mined at ``difficulty``; returns the difficulty for the next block."""
+        with self._lock:
+            if difficulty != self.difficulty:
+                return self.difficulty
+            self._times.append(seconds)
+            if len(self._times) == self.window:
+                median = statistics.median(self._times)
+                step = 0
+                if median * WORK_FACTOR ** 0.5 < self.target_seconds:
+                    step = 1
+                elif median > self.target_seconds * WORK_FACTOR ** 0.5:
+                    step = -1
+                new = self._clamp(self.difficulty + step)
+                if new != self.difficulty:
+                    self.difficulty = new
+                    self.retargets += 1
+                    self._times.clear()
+            return self.difficulty
+
+    def status(self):
+        with self._lock:
+            return {'difficulty': self.difficulty, 'target_seconds': self.target_seconds,
+                    'min_difficulty': self.min_difficulty, 'max_difficulty': self.max_difficulty,
+                    'window': self.window, 'retargets': self.retargets,
+                    'recent_seconds': list(self._times)}
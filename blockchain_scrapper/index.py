@@ -0,0 +1,212 @@
+import hashlib, json, threading
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+
+def is_batch(data: Dict[str, Any]) -> bool:
+    return isinstance(data, dict) and set(data) == {'merkle_root', 'records'} and isinstance(data['records'], list)
+
+
+def check_batch_records(records: Any):
+    """ValueError unless ``records`` can be stored as a batch: a non-empty list of objects."""
+    if not isinstance(records, list) or not records:
+        raise ValueError('A batch needs a non-empty list of records')
+    if not all(isinstance(r, dict) for r in records):
+        raise ValueError('Every batch record must be an object')
+
+
+def block_records(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Records stored in a block: the batch records, or the data itself."""
+    return data['records'] if is_batch(data) else [data]
+
+
+def normalize(value: Any) -> str:
+    return str(value).strip().casefold()
+
+
+def canonical_record(record: Any) -> bytes:
+    # same bytes as a Merkle leaf in blockchain.merkle_root
+    return json.dumps(record, sort_keys=True, ensure_ascii=False).encode('utf-8')
+
+
+class IndexUnavailable(RuntimeError):
+    """The index is still being rebuilt, or its last rebuild failed."""
+
+
+def wait_ready(index, timeout: Optional[float]):
+    if not index.ready.wait(timeout):
+        raise IndexUnavailable(f'{type(index).__name__} is still being rebuilt')
+    if index.error is not None:
+        raise IndexUnavailable(f'{type(index).__name__} rebuild failed: {index.error}')
+
+
+class ChainIndex:
+    """In-memory lookups kept next to Blockchain.chain.
+
+    ``by_hash`` maps a block hash to its height; ``by_field`` maps each
+    configured record field (e.g. 'Tên địa điểm') from its normalized value
+    to the heights of the blocks holding a record with that value.
+
+    ``ready`` is set once a rebuild has covered the whole chain, or has
+    failed (``error`` then holds why); appends made during a background
+    rebuild are indexed right away.
+    """
+
+    def __init__(self, fields: Sequence[str] = ()):
+        self.fields = tuple(fields)
+        self.by_hash: Dict[str, int] = {}
+        self.by_field: Dict[str, Dict[str, List[int]]] = {f: {} for f in self.fields}
+        self.ready = threading.Event()
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def add(self, block):
+        with self._lock:
+            self._add(block)
+
+    def _add(self, block):
+        self.by_hash[block.hash] = block.index
+        for record in block_records(block.data):
+            if not isinstance(record, dict):
+                continue
+            for field in self.fields:
+                if field not in record:
+                    continue
+                heights = self.by_field[field].setdefault(normalize(record[field]), [])
+                if not heights or heights[-1] != block.index:
+                    heights.append(block.index)
+
+    def rebuild(self, blocks: Iterable):
+        self.ready.clear()
+        self.error = None
+        try:
+            with self._lock:
+                self.by_hash.clear()
+                for values in self.by_field.values():
+                    values.clear()
+            for block in blocks:
+                self.add(block)
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+            raise
+        finally:
+            self.ready.set()
+
+    def wait(self, timeout: Optional[float] = None):
+        """Until the index covers the whole chain; IndexUnavailable on timeout or a failed rebuild."""
+        wait_ready(self, timeout)
+
+    def rebuild_async(self, blocks: Iterable) -> threading.Thread:
+        thread = threading.Thread(target=self.rebuild, args=(blocks,), name='chain-index', daemon=True)
+        self.ready.clear()
+        thread.start()
+        return thread
+
+    def truncate(self, height: int):
+        """Forget blocks at or above ``height``."""
+        with self._lock:
+            self.by_hash = {h: i for h, i in self.by_hash.items() if i < height}
+            for values in self.by_field.values():
+                for key in list(values):
+                    kept = [i for i in values[key] if i < height]
+                    if kept:
+                        values[key] = kept
+                    else:
+                        del values[key]
+
+    def height_of(self, block_hash: str) -> Optional[int]:
+        return self.by_hash.get(block_hash)
+
+    def search(self, field: str, value: Any) -> List[int]:
+        """Heights of blocks with a record whose ``field`` equals ``value``; KeyError if not indexed."""
+        with self._lock:
+            return sorted(set(self.by_field[field].get(normalize(value), ())))
+
+
+HEIGHT_BITS = 28
+HEIGHT_MASK = (1 << HEIGHT_BITS) - 1
+
+
+class RecordIndex:
+    """Compact content-hash index of every record in the chain.
+
+    Each record costs one uint64: the top 36 bits of the sha256 of its
+    canonical bytes, packed with the height of its block. Entries live in
+    sorted ``array('Q')`` runs (new ones are buffered, then sorted into a
+    run; runs of similar size are merged up to ``max_run``), so a lookup is
+    one bisect per run. A prefix match is only a candidate: the caller
+    compares the stored record before treating it as a duplicate.
+    """
+
+    def __init__(self, run_size: int = 1 << 16, max_run: int = 1 << 20):
+        self.run_size = run_size
+        self.max_run = max_run
+        self.runs: List[array] = []
+        self._buffer: List[int] = []
+        self.ready = threading.Event()
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def prefix(encoded: bytes) -> int:
+        return int.from_bytes(hashlib.sha256(encoded).digest()[:8], 'big') >> HEIGHT_BITS
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs) + len(self._buffer)
+
+    def add(self, block):
+        if block.index > HEIGHT_MASK:
+            raise OverflowError('RecordIndex holds heights below 2**28')
+        entries = [self.prefix(canonical_record(r)) << HEIGHT_BITS | block.index for r in block_records(block.data)]
+        with self._lock:
+            self._buffer.extend(entries)
+            if len(self._buffer) >= self.run_size:
+                self._flush()
+
+    def _flush(self):
+        run = array('Q', sorted(self._buffer))
+        self._buffer = []
+        while self.runs and len(self.runs[-1]) <= len(run) * 2 and len(self.runs[-1]) + len(run) <= self.max_run:
+            run = array('Q', sorted(self.runs.pop() + run))
+        self.runs.append(run)
+
+    def candidates(self, encoded: bytes) -> Iterator[int]:
+        """Heights of blocks that may hold a record with these canonical bytes, oldest first."""
+        prefix = self.prefix(encoded)
+        with self._lock:
+            found = [e & HEIGHT_MASK for e in self._buffer if e >> HEIGHT_BITS == prefix]
+            for run in self.runs:
+                i = bisect_left(run, prefix << HEIGHT_BITS)
+                while i < len(run) and run[i] >> HEIGHT_BITS == prefix:
+                    found.append(run[i] & HEIGHT_MASK)
+                    i += 1
+        return iter(sorted(set(found)))
+
+    def truncate(self, height: int):
+        with self._lock:
+            self._buffer = [e for e in self._buffer if e & HEIGHT_MASK < height]
+            self.runs = [array('Q', (e for e in run if e & HEIGHT_MASK < height)) for run in self.runs]
+
+    def rebuild(self, blocks: Iterable):
+        self.ready.clear()
+        self.error = None
+        try:
+            with self._lock:
+                self.runs, self._buffer = [], []
+            for block in blocks:
+                self.add(block)
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+            raise
+        finally:
+            self.ready.set()
+
+    def wait(self, timeout: Optional[float] = None):
+        wait_ready(self, timeout)
+
+    def rebuild_async(self, blocks: Iterable) -> threading.Thread:
+        thread = threading.Thread(target=self.rebuild, args=(blocks,), name='record-index', daemon=True)
+        self.ready.clear()
+        thread.start()
+        return thread
@@ -0,0 +1,84 @@
+import bisect, threading, time
+from collections import deque
+from typing import Any, Dict, Optional
+
+# upper bounds (seconds) of the mining-time histogram buckets; the last one is open
+MINING_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class MiningMetrics:
+    """Counters behind /metrics: mining time histogram, hash rate and append throughput.
+
+    Rates over the last ``window_seconds`` come from a short deque of recent
+    events; totals are kept since start.
+    """
+
+    def __init__(self, window_seconds: float = 60.0):
+        self.window_seconds = window_seconds
+        self.started = time.time()
+        self.bucket_counts = [0] * (len(MINING_BUCKETS) + 1)
+        self.mined_blocks = 0
+        self.mining_seconds = 0.0
+        self.attempts = 0
+        self.appended_blocks = 0
+        self.appended_records = 0
+        self.last_mining: Optional[Dict[str, Any]] = None
+        self._recent_mining: deque = deque()
+        self._recent_appends: deque = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, events: deque, now: float):
+        while events and events[0][0] < now - self.window_seconds:
+            events.popleft()
+
+    def observe_mining(self, seconds: float, attempts: int, difficulty: int):
+        now = time.time()
+        with self._lock:
+            self.bucket_counts[bisect.bisect_left(MINING_BUCKETS, seconds)] += 1
+            self.mined_blocks += 1
+            self.mining_seconds += seconds
+            self.attempts += attempts
+            self.last_mining = {'seconds': seconds, 'attempts': attempts, 'difficulty': difficulty, 'at': now}
+            self._recent_mining.append((now, seconds, attempts))
+            self._trim(self._recent_mining, now)
+
+    def observe_append(self, blocks: int, records: int):
+        now = time.time()
+        with self._lock:
+            self.appended_blocks += blocks
+            self.appended_records += records
+            self._recent_appends.append((now, blocks, records))
+            self._trim(self._recent_appends, now)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            self._trim(self._recent_mining, now)
+            self._trim(self._recent_appends, now)
+            recent_seconds = sum(s for _, s, _ in self._recent_mining)
+            recent_attempts = sum(a for _, _, a in self._recent_mining)
+            span = min(self.window_seconds, max(now - self.started, 1e-9))
+            cumulative, buckets = 0, []
+            for bound, count in zip(MINING_BUCKETS + (None,), self.bucket_counts):
+                cumulative += count
+                buckets.append({'le': bound if bound is not None else '+Inf', 'count': cumulative})
+            return {
+                'mining': {
+                    'blocks': self.mined_blocks,
+                    'seconds_total': self.mining_seconds,
+                    'seconds_avg': self.mining_seconds / self.mined_blocks if self.mined_blocks else None,
+                    'histogram': buckets,
+                    'last': self.last_mining,
+                },
+                'hash_rate': {
+                    'total': self.attempts / self.mining_seconds if self.mining_seconds else None,
+                    'recent': recent_attempts / recent_seconds if recent_seconds else None,
+                },
+                'appends': {
+                    'blocks': self.appended_blocks,
+                    'records': self.appended_records,
+                    'blocks_per_second': sum(b for _, b, _ in self._recent_appends) / span,
+                    'records_per_second': sum(r for _, _, r in self._recent_appends) / span,
+                    'window_seconds': self.window_seconds,
+                },
+            }
@@ -0,0 +1,125 @@
+import multiprocessing, os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+from blockchain import Block, HashTemplate
+
+# a pool worker checks the shared best nonce every CHECK_EVERY nonces
+CHECK_EVERY = 4096
+NO_WINNER = 2 ** 63 - 1
+# lowest winning nonce found so far by any worker, shared through the pool initializer
+_best = None
+
+
+# fork keeps workers from re-importing the Flask app module; spawned workers
+# would re-run its setup (open the store, start a mining queue and replicator)
+CAN_FORK = 'fork' in multiprocessing.get_all_start_methods()
+
+
+def _context():
+    return multiprocessing.get_context('fork') if CAN_FORK else multiprocessing.get_context()
+
+
+def _init_worker(best):
+    global _best
+    _best = best
+
+
+def make_process_pool(workers: int, initializer=None, initargs=()) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=workers, mp_context=_context(),
+                               initializer=initializer, initargs=initargs)
+
+
+def search_range(parts: Tuple[bytes, bytes], difficulty: int, start: int,
+                 stop: int) -> Tuple[Optional[Tuple[int, str]], int]:
+    """First (nonce, hash) in [start, stop) meeting ``difficulty`` (or None), and the attempts made.
+
+    ``parts`` is Block.hash_parts(); the block data is encoded only once. In
+    a ProcessPoolMiner worker the search gives up as soon as another worker
+    has found a winner below the nonces still left to try.
+    """
+    template = HashTemplate(*parts)
+    target = '0' * difficulty
+    for first in range(start, stop, CHECK_EVERY):
+        if _best is not None and _best.value < first:
+            return None, first - start
+        for nonce in range(first, min(first + CHECK_EVERY, stop)):
+            computed = template.hexdigest(nonce)
+            if computed.startswith(target):
+                if _best is not None:
+                    with _best.get_lock():
+                        _best.value = min(_best.value, nonce)
+                return (nonce, computed), nonce - start + 1
+    return None, stop - start
+
+
+class SerialMiner:
+    """In-process nonce search; same result as Blockchain.proof_of_work."""
+
+    def __init__(self):
+        self.last_attempts = 0
+
+    def mine(self, block: Block, difficulty: int) -> Tuple[int, str]:
+        (nonce, computed), self.last_attempts = search_range(block.hash_parts(), difficulty, block.nonce, NO_WINNER)
+        return nonce, computed
+
+    def close(self):
+        pass
+
+
+class ProcessPoolMiner:
+    """Splits the nonce space across a process pool.
+
+    Work is handed out in rounds of ``workers`` consecutive chunks. Once a
+    worker finds a winner, workers searching above it stop within
+    CHECK_EVERY nonces; those below it finish, so the lowest winning nonce
+    is kept and the result is the same nonce a serial search would find.
+    By default a chunk is the expected work for ``difficulty`` split across
+    the workers. ``last_attempts`` counts only the hashes actually computed.
+    """
+
+    def __init__(self, workers: Optional[int] = None, chunk_size: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.last_attempts = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._best = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._best = _context().Value('q', NO_WINNER)
+            self._pool = make_process_pool(self.workers, _init_worker, (self._best,))
+        return self._pool
+
+    def mine(self, block: Block, difficulty: int) -> Tuple[int, str]:
+        pool = self._executor()
+        parts = block.hash_parts()
+        chunk_size = self.chunk_size or max(CHECK_EVERY, 16 ** difficulty // self.workers)
+        start = block.nonce
+        attempts = 0
+        self._best.value = NO_WINNER
+        while True:
+            futures = [
+                pool.submit(search_range, parts, difficulty,
+                            start + k * chunk_size, start + (k + 1) * chunk_size)
+                for k in range(self.workers)
+            ]
+            found = [f.result() for f in futures]
+            attempts += sum(made for _, made in found)
+            hits = [hit for hit, _ in found if hit is not None]
+            if hits:
+                self.last_attempts = attempts
+                return min(hits)
+            start += self.workers * chunk_size
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+def make_miner(workers: int):
+    """Serial miner for ``workers`` <= 1 or without fork, otherwise a process pool of that size."""
+    if workers > 1 and not CAN_FORK:
+        print(f"MINER_WORKERS={workers} needs the fork start method; mining serially")
+        workers = 1
+    return ProcessPoolMiner(workers) if workers > 1 else SerialMiner()
@@ -0,0 +1,138 @@
+import queue, threading, time, uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from blockchain import Blockchain
+from index import canonical_record
+
+
+class MiningQueue:
+    """Single writer for a Blockchain, fed by a bounded queue.
+
+    Producers submit lists of records and get a ticket ID back straight
+    away. One worker thread drains whatever is queued (up to
+    ``max_records``), mines it as one block (a batch block when there is
+    more than one record) and marks the tickets mined. Only this thread
+    appends, so two requests can no longer both extend the same tip.
+
+    With a deduplicating chain (``bc.records``) the worker also drops records
+    already in the chain or repeated within what it drained, so retried or
+    concurrent submissions are mined once. Such records are listed under
+    ``duplicates`` in their ticket; a ticket left with nothing to mine ends
+    as ``duplicate``.
+    """
+
+    def __init__(self, bc: Blockchain, maxsize: int = 1000, max_records: int = 500, keep_tickets: int = 10000):
+        self.bc = bc
+        self.max_records = max_records
+        self.keep_tickets = keep_tickets
+        self._queue: 'queue.Queue[tuple]' = queue.Queue(maxsize=maxsize)
+        self._tickets: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._cond = threading.Condition()
+        self._worker = threading.Thread(target=self._run, name='mining-worker', daemon=True)
+        self._worker.start()
+
+    def submit(self, records: List[Dict[str, Any]]) -> str:
+        """Queue records for mining; raises queue.Full when the queue is at capacity."""
+        ticket_id = uuid.uuid4().hex
+        with self._cond:
+            self._tickets[ticket_id] = {'status': 'queued', 'records': len(records), 'created_at': time.time()}
+            while len(self._tickets) > self.keep_tickets:
+                self._tickets.popitem(last=False)
+        try:
+            self._queue.put_nowait((ticket_id, records))
+        except queue.Full:
+            with self._cond:
+                self._tickets.pop(ticket_id, None)
+            raise
+        return ticket_id
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def get(self, ticket_id: str, wait: float = 0) -> Optional[Dict[str, Any]]:
+        """Ticket state; with ``wait`` > 0 block until it is no longer queued (long-poll)."""
+        deadline = time.time() + wait
+        with self._cond:
+            while True:
+                ticket = self._tickets.get(ticket_id)
+                remaining = deadline - time.time()
+                if ticket is None or ticket['status'] != 'queued' or remaining <= 0:
+                    return dict(ticket) if ticket else None
+                self._cond.wait(remaining)
+
+    def _take_jobs(self) -> List[tuple]:
+        jobs = [self._queue.get()]
+        count = len(jobs[0][1])
+        while count < self.max_records:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            jobs.append(job)
+            count += len(job[1])
+        return jobs
+
+    def _split(self, jobs: List[tuple]):
+        """Records to mine, and per job the kept count and its duplicates.
+
+        A duplicate is (index in the job, block, position) for a record in the
+        chain, or (index, None, position in the records to mine).
+        """
+        records, kept, duplicates, seen = [], [], [], {}
+        for _, job_records in jobs:
+            job_kept, job_duplicates = 0, []
+            for i, record in enumerate(job_records):
+                if self.bc.records is not None:
+                    encoded = canonical_record(record)
+                    if encoded in seen:
+                        job_duplicates.append((i, None, seen[encoded]))
+                        continue
+                    found = self.bc.find_record(record)
+                    if found is not None:
+                        job_duplicates.append((i,) + found)
+                        continue
+                    seen[encoded] = len(records)
+                records.append(record)
+                job_kept += 1
+            kept.append(job_kept)
+            duplicates.append(job_duplicates)
+        return records, kept, duplicates
+
+    def _run(self):
+        while True:
+            jobs = self._take_jobs()
+            block, error = None, None
+            records, kept, duplicates = [], [0] * len(jobs), [[] for _ in jobs]
+            try:
+                records, kept, duplicates = self._split(jobs)
+                if records:
+                    block = self.bc.add_block(records[0]) if len(records) == 1 else self.bc.add_batch(records)
+            except Exception as e:
+                print("Mining failed:", e)
+                error = str(e)
+            with self._cond:
+                offset = 0
+                for (ticket_id, _), job_kept, job_duplicates in zip(jobs, kept, duplicates):
+                    ticket = self._tickets.get(ticket_id)
+                    if ticket is not None:
+                        if error is not None:
+                            ticket.update(status='failed', error=error)
+                        elif job_kept:
+                            ticket.update(status='mined', height=block.index, hash=block.hash)
+                            if len(records) > 1:
+                                ticket['positions'] = [offset, offset + job_kept]
+                        else:
+                            ticket.update(status='duplicate')
+                        if error is None and job_duplicates:
+                            ticket['duplicates'] = [self._describe(d, block, len(records)) for d in job_duplicates]
+                        ticket['mined_at'] = time.time()
+                    offset += job_kept
+                self._cond.notify_all()
+
+    @staticmethod
+    def _describe(duplicate: tuple, block, mined_records: int) -> Dict[str, Any]:
+        index, existing, position = duplicate
+        if existing is None:
+            # repeats a record mined in this same block
+            existing, position = block, position if mined_records > 1 else None
+        return {'index': index, 'height': existing.index, 'hash': existing.hash, 'position': position}
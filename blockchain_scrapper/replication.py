@@ -0,0 +1,137 @@
+"""Follower-side replication from a leader node.
+
+A follower asks the leader for the blocks after its own tip
+(``/chain?since_hash=<tip>&format=raw``), checks only those blocks and
+appends them, so each sync costs O(new blocks). When the leader does not
+know the follower's tip the histories have diverged: the follower looks for
+the last common height (stepping back exponentially, then bisecting, one
+``/block/height/<n>`` request per probe) and replaces its blocks from there
+with the leader's, which always wins.
+
+    LEADER_URL=http://127.0.0.1:5000 PORT=5001 CHAIN_STORE=store_5001 python app_blockchain.py
+"""
+import threading, time
+from typing import Any, Dict, Optional
+import requests
+from blockchain import Block
+
+
+class ReplicationError(Exception):
+    pass
+
+
+class Replicator:
+    def __init__(self, bc, leader_url: str, page_size: int = 500, interval: float = 5.0, timeout: float = 30.0):
+        self.bc = bc
+        self.leader_url = leader_url.rstrip('/')
+        self.page_size = page_size
+        self.interval = interval
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.last_sync: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.leader_height: Optional[int] = None
+        self.blocks_received = 0
+        self.rollbacks = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _get(self, path: str, **params) -> Optional[Dict[str, Any]]:
+        """JSON body of a GET on the leader, or None on 404."""
+        response = self.session.get(self.leader_url + path, params=params, timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise ReplicationError(f'{path} answered {response.status_code}')
+        return response.json()
+
+    def _page(self, **cursor) -> Optional[Dict[str, Any]]:
+        return self._get('/chain', limit=self.page_size, format='raw', **cursor)
+
+    def _leader_hash(self, height: int) -> Optional[str]:
+        block = self._get(f'/block/height/{height}')
+        return block['hash'] if block else None
+
+    def common_height(self) -> int:
+        """Highest height where both chains hold the same block, or -1 if not even genesis matches."""
+        tip = len(self.bc.chain) - 1
+
+        def same(height):
+            return self._leader_hash(height) == self.bc.chain[height].hash
+
+        # step back 1, 2, 4, ... from the tip until a match, then bisect the gap
+        step, high, low = 1, tip, None
+        while low is None:
+            probe = max(tip - step, 0)
+            if same(probe):
+                low = probe
+            elif probe == 0:
+                return -1
+            else:
+                high, step = probe, step * 2
+        while high - low > 1:
+            mid = (low + high) // 2
+            if same(mid):
+                low = mid
+            else:
+                high = mid
+        return low
+
+    def sync_once(self) -> int:
+        """Pull everything the leader has past our tip; returns the number of blocks applied."""
+        with self._lock:
+            applied = 0
+            try:
+                page = self._page(since_hash=self.bc.last_block.hash)
+                if page is None:
+                    # leader does not know our tip: roll back to the common ancestor
+                    start = self.common_height() + 1
+                    page = self._page(from_height=start)
+                    if page is None:
+                        raise ReplicationError('leader chain changed during rollback')
+                    if start < len(self.bc.chain):
+                        self.rollbacks += 1
+                    applied += self._apply(start, page)
+                else:
+                    applied += self._apply(len(self.bc.chain), page)
+                while page['next_from_height'] is not None:
+                    page = self._page(from_height=len(self.bc.chain))
+                    if page is None:
+                        break
+                    applied += self._apply(len(self.bc.chain), page)
+                self.leader_height = page['height']
+                self.last_error = None
+            except (requests.RequestException, ReplicationError, ValueError, KeyError) as e:
+                self.last_error = str(e)
+                raise
+            finally:
+                self.last_sync = time.time()
+                self.blocks_received += applied
+            return applied
+
+    def _apply(self, height: int, page: Dict[str, Any]) -> int:
+        blocks = [Block.from_record(record) for record in page['blocks']]
+        return self.bc.replace_from(height, blocks)
+
+    def status(self) -> Dict[str, Any]:
+        return {'leader': self.leader_url, 'height': len(self.bc.chain), 'leader_height': self.leader_height,
+                'last_sync': self.last_sync, 'last_error': self.last_error,
+                'blocks_received': self.blocks_received, 'rollbacks': self.rollbacks,
+                'running': self._thread is not None and self._thread.is_alive()}
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sync_once()
+            except Exception as e:
+                print('Replication from', self.leader_url, 'failed:', e)
+            self._stop.wait(self.interval)
+
+    def start(self) -> threading.Thread:
+        self._thread = threading.Thread(target=self._run, name='replication', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,71 @@
+import gzip, os, threading
+from typing import Callable, Dict, Iterable, Tuple
+from storage import atomic_write
+
+
+class SnapshotCache:
+    """Whole-chain files rendered once per chain tip, plain and gzipped.
+
+    ``get(name, key, render)`` returns the paths of ``name`` and ``name.gz``
+    in ``directory``, re-rendering only when ``key`` (the tip) has changed.
+    Keys are saved next to the files, so a restart reuses what is on disk.
+    Renders are serialized per (name, key) only: a slow render of one file
+    or tip does not hold up requests for another.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._keys: Dict[str, str] = {}
+        self._lock = threading.Lock()       # guards _keys, _renders and installing files
+        self._renders: Dict[Tuple[str, str], threading.Lock] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, name: str) -> Tuple[str, str, str]:
+        path = os.path.join(self.directory, name)
+        return path, path + '.gz', path + '.key'
+
+    def _stored_key(self, name: str) -> str:
+        if name not in self._keys:
+            path, gz_path, key_path = self._paths(name)
+            try:
+                with open(key_path, 'r', encoding='utf-8') as f:
+                    key = f.read()
+            except OSError:
+                key = ''
+            self._keys[name] = key if os.path.exists(path) and os.path.exists(gz_path) else ''
+        return self._keys[name]
+
+    def get(self, name: str, key: str, render: Callable[[], Iterable], binary: bool = False) -> Tuple[str, str]:
+        """``render`` yields str chunks, or bytes with ``binary``."""
+        path, gz_path, key_path = self._paths(name)
+        with self._lock:
+            if self._stored_key(name) == key:
+                return path, gz_path
+            render_lock = self._renders.setdefault((name, key), threading.Lock())
+        with render_lock:
+            with self._lock:
+                if self._stored_key(name) == key:
+                    return path, gz_path
+            # unique temp names: a dropped render lock may let two threads in
+            token = f'{threading.get_ident()}.tmp'
+            tmp, gz_tmp = f'{path}.{token}', f'{gz_path}.{token}'
+            try:
+                with (gzip.open(gz_tmp, 'wb', compresslevel=6) if binary else
+                      gzip.open(gz_tmp, 'wt', encoding='utf-8', compresslevel=6)) as gz:
+                    def chunks():
+                        for chunk in render():
+                            gz.write(chunk)
+                            yield chunk
+                    atomic_write(tmp, chunks(), binary=binary)
+                with self._lock:
+                    os.replace(tmp, path)
+                    os.replace(gz_tmp, gz_path)
+                    atomic_write(key_path, [key])
+                    self._keys[name] = key
+            finally:
+                for leftover in (tmp, gz_tmp):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+                with self._lock:
+                    self._renders.pop((name, key), None)
+        return path, gz_path
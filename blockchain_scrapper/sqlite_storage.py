@@ -0,0 +1,162 @@
+"""SQLite storage backend for Blockchain.
+
+Drop-in alternative to storage.SegmentLog. Import an existing JSON export with:
+
+    python sqlite_storage.py migrate blockchain_data.json blockchain_store/chain.sqlite3
+"""
+import argparse, json, os, sqlite3, threading, time
+from typing import Any, Dict, Iterator, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    height INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL,
+    previous_hash TEXT NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blocks_hash ON blocks(hash);
+CREATE INDEX IF NOT EXISTS blocks_previous_hash ON blocks(previous_hash);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def canonical_bytes(record: Dict[str, Any]) -> bytes:
+    return json.dumps(record, sort_keys=True, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class SQLiteLog:
+    """One row per block in a WAL-mode SQLite database.
+
+    Appends are a single INSERT transaction on the writer connection; every
+    reading thread gets its own connection so WAL readers never block the
+    writer. Iteration streams rows from a cursor instead of loading the chain.
+    """
+
+    def __init__(self, path: str, fsync: bool = True, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if not read_only:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = self._connect()
+        if not read_only:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(f"PRAGMA synchronous={'FULL' if fsync else 'NORMAL'}")
+            self._conn.executescript(SCHEMA)
+        # height is the rowid, so MAX is a single b-tree seek; COUNT(*) walks
+        # every page of the table on open.
+        self._count = self._conn.execute(
+            'SELECT COALESCE(MAX(height) + 1, 0) FROM blocks').fetchone()[0]
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.read_only:
+            uri = 'file:' + os.path.abspath(self.path) + '?mode=ro'
+            return sqlite3.connect(uri, uri=True, check_same_thread=False, isolation_level=None)
+        return sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def __len__(self):
+        return self._count
+
+    def append(self, record: Dict[str, Any]):
+        self.append_many([record])
+
+    def append_many(self, records: List[Dict[str, Any]]):
+        with self._lock:
+            rows = [(self._count + i, r['hash'], r['previous_hash'], canonical_bytes(r))
+                    for i, r in enumerate(records)]
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.executemany(
+                    'INSERT INTO blocks (height, hash, previous_hash, body) VALUES (?, ?, ?, ?)', rows)
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._count += len(rows)
+
+    def truncate(self, height: int):
+        """Drop every block at or above ``height`` (used when a replica rolls back)."""
+        with self._lock:
+            self._conn.execute('DELETE FROM blocks WHERE height >= ?', (height,))
+            self._count = min(self._count, height)
+
+    def read(self, height: int) -> Dict[str, Any]:
+        if not 0 <= height < self._count:
+            raise IndexError(height)
+        row = self._reader().execute('SELECT body FROM blocks WHERE height = ?', (height,)).fetchone()
+        return json.loads(row[0])
+
+    def height_of(self, block_hash: str) -> Optional[int]:
+        row = self._reader().execute('SELECT height FROM blocks WHERE hash = ?', (block_hash,)).fetchone()
+        return row[0] if row else None
+
+    def iter_from(self, height: int = 0) -> Iterator[Dict[str, Any]]:
+        cursor = self._reader().execute(
+            'SELECT body FROM blocks WHERE height >= ? AND height < ? ORDER BY height', (height, self._count))
+        for (body,) in cursor:
+            yield json.loads(body)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.iter_from(0)
+
+    def load_meta(self, name: str) -> Optional[Dict[str, Any]]:
+        row = self._reader().execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_meta(self, name: str, value: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)',
+                               (name, json.dumps(value, ensure_ascii=False)))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def migrate(json_path: str, db_path: str, batch_size: int = 10000):
+    """Import a chain export (the /download format) into an empty SQLite store, streaming it."""
+    from verify import iter_chain_file, to_block
+    store = SQLiteLog(db_path)
+    if len(store):
+        raise SystemExit(f'{db_path} already holds {len(store)} blocks')
+    start = time.perf_counter()
+    batch = []
+    with open(json_path, 'r', encoding='utf-8') as f:
+        for item in iter_chain_file(f):
+            batch.append(to_block(item).to_record())
+            if len(batch) == batch_size:
+                store.append_many(batch)
+                batch = []
+    if batch:
+        store.append_many(batch)
+    print(f'Imported {len(store)} blocks into {db_path} in {time.perf_counter() - start:.2f}s')
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    mig = sub.add_parser('migrate', help='import a JSON chain export')
+    mig.add_argument('json_path')
+    mig.add_argument('db_path')
+    args = parser.parse_args()
+    if args.command == 'migrate':
+        migrate(args.json_path, args.db_path)
+
+
+if __name__ == '__main__':
+    main()
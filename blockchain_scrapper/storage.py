@@ -0,0 +1,629 @@
+import argparse, hashlib, json, mmap, os, threading, zlib
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional
+
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.log'
+INDEX_SUFFIX = '.idx'
+ARCHIVE_SUFFIX = '.arc'
+SUMMARY_SUFFIX = '.arc.json'
+# records per zlib frame in an archive: reading one record inflates one frame
+FRAME_RECORDS = 256
+
+
+def encode_record(record: Dict[str, Any]) -> bytes:
+    payload = json.dumps(record, sort_keys=True, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return b'%08x ' % zlib.crc32(payload) + payload + b'\n'
+
+
+def decode_record(line: bytes) -> Optional[Dict[str, Any]]:
+    """Return the record stored on ``line`` or None if it is torn/corrupt."""
+    if not line.endswith(b'\n') or len(line) < 10 or line[8:9] != b' ':
+        return None
+    payload = line[9:-1]
+    try:
+        if int(line[:8], 16) != zlib.crc32(payload):
+            return None
+        return json.loads(payload)
+    except ValueError:
+        return None
+
+
+def fsync_dir(directory: str):
+    if os.name == 'nt':
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: str, chunks, binary: bool = False):
+    """Write an iterable of str (or bytes) chunks to ``path`` via a temp file + rename."""
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp = f'{path}.tmp'
+    with (open(tmp, 'wb') if binary else open(tmp, 'w', encoding='utf-8')) as f:
+        for chunk in chunks:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    fsync_dir(directory)
+
+
+def archive_segment(log_path: str, arc_path: str) -> Dict[str, Any]:
+    """Rewrite a sealed segment as zlib frames; returns (and saves) its summary."""
+    digest = hashlib.sha256()
+    frames, state = [0], {'count': 0, 'bytes': 0, 'first': None, 'last': None}
+
+    def chunks():
+        batch = []
+        with open(log_path, 'rb') as f:
+            for line in f:
+                digest.update(line)
+                if state['first'] is None:
+                    state['first'] = line
+                state['last'] = line
+                state['count'] += 1
+                state['bytes'] += len(line)
+                batch.append(line)
+                if len(batch) == FRAME_RECORDS:
+                    yield pack(batch)
+                    batch = []
+        if batch:
+            yield pack(batch)
+
+    def pack(lines):
+        frame = zlib.compress(b''.join(lines), 6)
+        frames.append(frames[-1] + len(frame))
+        return frame
+
+    atomic_write(arc_path, chunks(), binary=True)
+    first, last = decode_record(state['first']), decode_record(state['last'])
+    summary = {
+        'first_height': first['index'], 'last_height': last['index'], 'count': state['count'],
+        'first_hash': first['hash'], 'last_hash': last['hash'], 'previous_hash': first['previous_hash'],
+        'digest': digest.hexdigest(), 'bytes': state['bytes'], 'compressed_bytes': frames[-1],
+        'frame_records': FRAME_RECORDS, 'frames': frames,
+    }
+    atomic_write(arc_path[:-len(ARCHIVE_SUFFIX)] + SUMMARY_SUFFIX, [json.dumps(summary)])
+    return summary
+
+
+class ArchivedSegment:
+    """Read side of an archived (compressed, immutable) segment.
+
+    ``summary`` comes from the ``.arc.json`` file next to it: height range,
+    first and last hash, sha256 digest of the original segment bytes and
+    the offset of every frame. A few recently inflated frames are cached.
+    """
+
+    def __init__(self, path: str, summary: Dict[str, Any], cache_frames: int = 4):
+        self.path = path
+        self.summary = summary
+        self.frame_records = summary['frame_records']
+        self.frames = array('Q', summary['frames'])
+        self.cache_frames = cache_frames
+        self._cache: 'OrderedDict[int, List[bytes]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> Optional['ArchivedSegment']:
+        try:
+            with open(path[:-len(ARCHIVE_SUFFIX)] + SUMMARY_SUFFIX, 'r', encoding='utf-8') as f:
+                return cls(path, json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def __len__(self):
+        return self.summary['count']
+
+    def _inflate(self, f, i: int) -> List[bytes]:
+        f.seek(self.frames[i])
+        return zlib.decompress(f.read(self.frames[i + 1] - self.frames[i])).splitlines(keepends=True)
+
+    def read_line(self, local: int) -> bytes:
+        i = local // self.frame_records
+        with self._lock:
+            lines = self._cache.get(i)
+            if lines is not None:
+                self._cache.move_to_end(i)
+        if lines is None:
+            with open(self.path, 'rb') as f:
+                lines = self._inflate(f, i)
+            with self._lock:
+                self._cache[i] = lines
+                while len(self._cache) > self.cache_frames:
+                    self._cache.popitem(last=False)
+        return lines[local % self.frame_records]
+
+    def iter_lines(self, local: int = 0) -> Iterator[bytes]:
+        # sequential scans inflate each frame once and skip the cache
+        with open(self.path, 'rb') as f:
+            for i in range(local // self.frame_records, len(self.frames) - 1):
+                lines = self._inflate(f, i)
+                yield from (lines[local % self.frame_records:] if i == local // self.frame_records else lines)
+
+    def verify(self) -> bool:
+        """Whether the inflated frames still hash to the summary digest."""
+        digest = hashlib.sha256()
+        for line in self.iter_lines():
+            digest.update(line)
+        return digest.hexdigest() == self.summary['digest']
+
+
+class SegmentLog:
+    """Append-only block log made of rolling segment files.
+
+    Each block is one line ``<crc32> <canonical json>``. Only the newest
+    segment is ever written to; older ones are sealed. On open the newest
+    segment is scanned and a torn or corrupt tail is truncated away.
+    Concurrent appenders share fsyncs (group commit): whoever syncs first
+    makes every record written so far durable.
+
+    Segment files are named after the height of their first block, and a
+    sealed segment gets a ``.idx`` file of uint64 line offsets. Opening the
+    log therefore reads only the offset files and the active segment, and
+    ``read(height)`` fetches one record through a memory map.
+
+    With ``archive_keep`` set, sealed segments older than the newest
+    ``archive_keep`` are rewritten in the background as compressed archives
+    (see ArchivedSegment) and read from there on demand.
+    """
+
+    def __init__(self, directory: str, segment_size: int = 64 * 1024 * 1024, fsync: bool = True,
+                 read_only: bool = False, archive_keep: Optional[int] = None):
+        self.directory = directory
+        # read_only: never truncate, write index files or append (safe next to a live writer)
+        self.read_only = read_only
+        self.segment_size = segment_size
+        self.fsync = fsync
+        self.archive_keep = archive_keep
+        self._lock = threading.Lock()
+        self._archive_lock = threading.Lock()
+        self._archiver: Optional[threading.Thread] = None
+        # archived segments by first height
+        self._archives: Dict[int, ArchivedSegment] = {}
+        self._sync_lock = threading.Lock()
+        self._written = 0
+        self._synced = 0
+        os.makedirs(directory, exist_ok=True)
+        self._segments = self._list_segments()
+        self._starts = [self._first_height(p) for p in self._segments]
+        self._offsets: List[array] = []
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._count = self._recover()
+        self._fh = None
+        self._reader = None
+        if self._segments and not read_only and not self._is_archived(len(self._segments) - 1):
+            self._fh = open(self._segments[-1], 'ab')
+
+    def _list_segments(self) -> List[str]:
+        by_start: Dict[int, str] = {}
+        for name in sorted(os.listdir(self.directory)):
+            if not name.startswith(SEGMENT_PREFIX) or not name.endswith((SEGMENT_SUFFIX, ARCHIVE_SUFFIX)):
+                continue
+            path = os.path.join(self.directory, name)
+            start = self._first_height(path)
+            if name.endswith(ARCHIVE_SUFFIX):
+                archive = ArchivedSegment.load(path)
+                if archive is None:
+                    continue  # archiving never finished; the .log is still there
+                self._archives[start] = archive
+            by_start[start] = path
+        if not self.read_only:
+            # a finished archive supersedes the log it was made from
+            for start in self._archives:
+                log = self._segment_path(start)
+                for leftover in (log, log[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+        return [by_start[start] for start in sorted(by_start)]
+
+    def _is_archived(self, seg: int) -> bool:
+        return self._segments[seg].endswith(ARCHIVE_SUFFIX)
+
+    def _seg_len(self, seg: int) -> int:
+        if self._is_archived(seg):
+            return len(self._archives[self._starts[seg]])
+        return len(self._offsets[seg])
+
+    def _segment_path(self, first_height: int) -> str:
+        return os.path.join(self.directory, f'{SEGMENT_PREFIX}{first_height:012d}{SEGMENT_SUFFIX}')
+
+    @staticmethod
+    def _first_height(path: str) -> int:
+        return int(os.path.basename(path)[len(SEGMENT_PREFIX):].split('.')[0])
+
+    @staticmethod
+    def _scan_offsets(path: str) -> array:
+        offsets, pos = array('Q'), 0
+        with open(path, 'rb') as f:
+            for line in f:
+                offsets.append(pos)
+                pos += len(line)
+        return offsets
+
+    def _write_index(self, path: str, offsets: array):
+        atomic_write(path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX, [offsets.tobytes()], binary=True)
+
+    def _load_index(self, path: str) -> array:
+        offsets = array('Q')
+        try:
+            with open(path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX, 'rb') as f:
+                offsets.frombytes(f.read())
+        except (OSError, ValueError):
+            offsets = self._scan_offsets(path)
+            if not self.read_only:
+                self._write_index(path, offsets)
+        return offsets
+
+    def _recover(self) -> int:
+        # archived segments need no offsets; their frame table is in the summary
+        self._offsets = [array('Q') if path.endswith(ARCHIVE_SUFFIX) else self._load_index(path)
+                         for path in self._segments[:-1]]
+        if not self._segments:
+            return 0
+        last = self._segments[-1]
+        if last.endswith(ARCHIVE_SUFFIX):
+            self._offsets.append(array('Q'))
+            return sum(self._seg_len(i) for i in range(len(self._segments)))
+        offsets, good_end = array('Q'), 0
+        with open(last, 'rb') as f:
+            for line in f:
+                if decode_record(line) is None:
+                    break
+                offsets.append(good_end)
+                good_end += len(line)
+        self._offsets.append(offsets)
+        if good_end != os.path.getsize(last) and not self.read_only:
+            print(f"Truncating torn tail of {last} at byte {good_end}")
+            with open(last, 'r+b') as f:
+                f.truncate(good_end)
+                f.flush()
+                os.fsync(f.fileno())
+        return sum(self._seg_len(i) for i in range(len(self._segments)))
+
+    def __len__(self):
+        return self._count
+
+    def _roll(self):
+        if self._fh is not None:
+            self._fh.flush()
+            if self.fsync:
+                os.fsync(self._fh.fileno())
+            self._fh.close()
+            self._synced = self._written
+            self._write_index(self._segments[-1], self._offsets[-1])
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+        path = self._segment_path(self._count)
+        self._fh = open(path, 'ab')
+        self._segments.append(path)
+        self._starts.append(self._count)
+        self._offsets.append(array('Q'))
+        if self.fsync:
+            fsync_dir(self.directory)
+        if self.archive_keep is not None and (self._archiver is None or not self._archiver.is_alive()):
+            self._archiver = threading.Thread(target=self.archive_cold, name='segment-archiver', daemon=True)
+            self._archiver.start()
+
+    def archive_cold(self, keep: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Archive every sealed segment but the newest ``keep``; returns the new summaries.
+
+        Each segment is archived under ``_archive_lock``, which truncate() also
+        takes, so a rollback never races an archive of the segment it cuts.
+        """
+        keep = self.archive_keep if keep is None else keep
+        if self.read_only:
+            raise PermissionError(f'{self.directory} is opened read-only')
+        summaries = []
+        with self._lock:
+            sealed = [(self._starts[i], p) for i, p in enumerate(self._segments[:-1])
+                      if p.endswith(SEGMENT_SUFFIX)]
+        for start, log_path in sealed[:max(len(sealed) - (keep or 0), 0)]:
+            with self._archive_lock:
+                with self._lock:
+                    seg = bisect_right(self._starts, start) - 1
+                    if seg < 0 or seg >= len(self._segments) - 1 or self._segments[seg] != log_path:
+                        continue  # truncated away, or now the active segment
+                arc_path = log_path[:-len(SEGMENT_SUFFIX)] + ARCHIVE_SUFFIX
+                try:
+                    summary = archive_segment(log_path, arc_path)
+                except FileNotFoundError:
+                    continue
+                with self._lock:
+                    self._archives[start] = ArchivedSegment(arc_path, summary)
+                    self._segments[seg] = arc_path
+                    self._offsets[seg] = array('Q')
+                    # readers may still hold the map; it closes once they drop it
+                    self._maps.pop(seg, None)
+                for leftover in (log_path, log_path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX):
+                    try:
+                        os.remove(leftover)
+                    except OSError:
+                        pass  # removed on the next open instead
+                summaries.append(summary)
+        if summaries:
+            fsync_dir(self.directory)
+        return summaries
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        """One entry per segment: the archive summary, or height range and size of a plain segment."""
+        with self._lock:
+            out = []
+            for seg, path in enumerate(self._segments):
+                if self._is_archived(seg):
+                    info = {k: v for k, v in self._archives[self._starts[seg]].summary.items() if k != 'frames'}
+                    out.append(dict(info, archived=True))
+                else:
+                    count = len(self._offsets[seg])
+                    out.append({'first_height': self._starts[seg], 'last_height': self._starts[seg] + count - 1,
+                                'count': count, 'archived': False, 'active': seg == len(self._segments) - 1})
+            return out
+
+    def append(self, record: Dict[str, Any]):
+        self.append_many([record])
+
+    def append_many(self, records: List[Dict[str, Any]]):
+        if self.read_only:
+            raise PermissionError(f'{self.directory} is opened read-only')
+        with self._lock:
+            for record in records:
+                if self._fh is None or self._fh.tell() >= self.segment_size:
+                    self._roll()
+                self._offsets[-1].append(self._fh.tell())
+                self._fh.write(encode_record(record))
+                self._count += 1
+            self._fh.flush()
+            self._written += 1
+            seq = self._written
+        if self.fsync:
+            self._wait_durable(seq)
+
+    def _wait_durable(self, seq: int):
+        # Threads that queue here while another one is inside fsync find
+        # their write already covered once they get the lock. The fsync runs
+        # outside _lock so appends (and reads) keep going meanwhile; a dup of
+        # the descriptor stays valid even if the segment rolls under it.
+        with self._sync_lock:
+            if self._synced >= seq:
+                return
+            with self._lock:
+                target = self._written
+                fd = os.dup(self._fh.fileno())
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._synced = max(self._synced, target)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.iter_from(0)
+
+    def iter_from(self, height: int = 0) -> Iterator[Dict[str, Any]]:
+        """Stream records from ``height`` to the current tip."""
+        with self._lock:
+            if self._fh is not None:
+                self._fh.flush()
+            remaining = self._count - height
+            if remaining <= 0:
+                return
+            seg = bisect_right(self._starts, height) - 1
+            starts = self._starts[seg:]
+        local = height - starts[0]
+        for start in starts:
+            for line in self._segment_lines(start, local):
+                if remaining == 0:
+                    return
+                record = decode_record(line)
+                if record is None:
+                    raise ValueError(f'Corrupt record in segment {start}')
+                remaining -= 1
+                yield record
+            local = 0
+
+    def _segment_lines(self, start: int, local: int) -> Iterator[bytes]:
+        # resolved when reached, so a segment archived mid-scan is read from its archive
+        with self._lock:
+            seg = bisect_right(self._starts, start) - 1
+            archive = self._archives.get(start) if self._is_archived(seg) else None
+            path = self._segments[seg]
+            offset = None if archive else (self._offsets[seg][local] if local < len(self._offsets[seg]) else None)
+        if archive is not None:
+            yield from archive.iter_lines(local)
+            return
+        if offset is None:
+            return
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            yield from self._archives[start].iter_lines(local)
+            return
+        with f:
+            f.seek(offset)
+            yield from f
+
+    def truncate(self, height: int):
+        """Drop every record at or above ``height`` (used when a replica rolls back).
+
+        Archives above ``height`` are deleted, and the one holding ``height``
+        is turned back into a plain segment first: a rollback is the only
+        time an archive changes.
+        """
+        if self.read_only:
+            raise PermissionError(f'{self.directory} is opened read-only')
+        with self._archive_lock, self._lock:
+            if height >= self._count:
+                return
+            seg = bisect_right(self._starts, height) - 1 if height > 0 else 0
+            # readers may still hold a map; each closes once they drop it
+            self._maps.clear()
+            for handle in (self._fh, self._reader):
+                if handle is not None:
+                    handle.close()
+            self._fh = self._reader = None
+            for path in self._segments[seg + 1:]:
+                self._remove_segment(path)
+            del self._segments[seg + 1:], self._starts[seg + 1:], self._offsets[seg + 1:]
+            local = height - self._starts[seg]
+            if self._is_archived(seg):
+                self._unarchive(seg, local)
+            idx = self._segments[seg][:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+            if os.path.exists(idx):
+                os.remove(idx)
+            offsets = self._offsets[seg]
+            end = offsets[local] if local < len(offsets) else os.path.getsize(self._segments[seg])
+            with open(self._segments[seg], 'r+b') as f:
+                f.truncate(end)
+                os.fsync(f.fileno())
+            del offsets[local:]
+            self._fh = open(self._segments[seg], 'ab')
+            self._count = height
+            self._synced = self._written
+            fsync_dir(self.directory)
+
+    def _remove_segment(self, path: str):
+        if path.endswith(ARCHIVE_SUFFIX):
+            self._archives.pop(self._first_height(path), None)
+            # the summary goes first: without it a leftover .arc is ignored on open
+            leftovers = (path[:-len(ARCHIVE_SUFFIX)] + SUMMARY_SUFFIX, path)
+        else:
+            leftovers = (path, path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX)
+        for leftover in leftovers:
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    def _unarchive(self, seg: int, count: int):
+        """Rewrite the first ``count`` records of archived segment ``seg`` as a plain segment."""
+        start = self._starts[seg]
+        arc_path = self._segments[seg]
+        log_path = self._segment_path(start)
+        offsets, pos = array('Q'), 0
+
+        def lines():
+            nonlocal pos
+            for i, line in enumerate(self._archives[start].iter_lines()):
+                if i == count:
+                    return
+                offsets.append(pos)
+                pos += len(line)
+                yield line
+
+        atomic_write(log_path, lines(), binary=True)
+        self._remove_segment(arc_path)
+        self._segments[seg] = log_path
+        self._offsets[seg] = offsets
+
+    def read(self, height: int) -> Dict[str, Any]:
+        """Random access to one record: bisect the segment, then its offset index."""
+        if not 0 <= height < self._count:
+            raise IndexError(height)
+        seg = bisect_right(self._starts, height) - 1
+        local = height - self._starts[seg]
+        archive = self._archives.get(self._starts[seg])
+        if archive is not None:
+            line = archive.read_line(local)
+            record = decode_record(line)
+            if record is None:
+                raise ValueError(f'Corrupt record at height {height}')
+            return record
+        offsets = self._offsets[seg]
+        start = offsets[local]
+        if seg < len(self._segments) - 1:
+            try:
+                mm = self._map(seg)
+            except FileNotFoundError:
+                return self.read(height)  # archived since the lookup above
+            end = offsets[local + 1] if local + 1 < len(offsets) else len(mm)
+            line = mm[start:end]
+        else:
+            with self._lock:
+                if self._fh is not None:
+                    self._fh.flush()
+                if self._reader is None:
+                    self._reader = open(self._segments[-1], 'rb')
+                self._reader.seek(start)
+                line = self._reader.readline()
+        record = decode_record(line)
+        if record is None:
+            raise ValueError(f'Corrupt record at height {height}')
+        return record
+
+    def _map(self, seg: int) -> mmap.mmap:
+        mm = self._maps.get(seg)
+        if mm is None:
+            with self._lock:
+                mm = self._maps.get(seg)
+                if mm is None:
+                    with open(self._segment_path(self._starts[seg]), 'rb') as f:
+                        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    self._maps[seg] = mm
+        return mm
+
+    def load_meta(self, name: str) -> Optional[Dict[str, Any]]:
+        """Read a small JSON side file stored next to the segments."""
+        path = os.path.join(self.directory, f'{name}.json')
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_meta(self, name: str, value: Dict[str, Any]):
+        path = os.path.join(self.directory, f'{name}.json')
+        atomic_write(path, [json.dumps(value, ensure_ascii=False)])
+
+    def close(self):
+        if self._archiver is not None:
+            self._archiver.join()
+        with self._lock:
+            for mm in self._maps.values():
+                mm.close()
+            self._maps.clear()
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+            if self._fh is not None:
+                self._fh.flush()
+                if self.fsync:
+                    os.fsync(self._fh.fileno())
+                self._fh.close()
+                self._fh = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or archive a segment store.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    arc = sub.add_parser('archive', help='compress sealed segments now')
+    arc.add_argument('store')
+    arc.add_argument('--keep', type=int, default=2, help='newest sealed segments to leave uncompressed')
+    seg = sub.add_parser('segments', help='list segment summaries')
+    seg.add_argument('store')
+    seg.add_argument('--verify', action='store_true', help='check archive digests')
+    args = parser.parse_args()
+    if args.command == 'archive':
+        log = SegmentLog(args.store)
+        for summary in log.archive_cold(args.keep):
+            print(f"archived {summary['first_height']}-{summary['last_height']}: "
+                  f"{summary['bytes']} -> {summary['compressed_bytes']} bytes")
+        log.close()
+    else:
+        log = SegmentLog(args.store, read_only=True)
+        for info in log.summaries():
+            line = f"{info['first_height']:>12}-{info['last_height']:<12} {info['count']:>8} blocks"
+            if info['archived']:
+                line += f" archived {info['compressed_bytes']}/{info['bytes']} bytes, digest {info['digest'][:16]}"
+                if args.verify:
+                    ok = log._archives[info['first_height']].verify()
+                    line += ' ok' if ok else ' DIGEST MISMATCH'
+            print(line)
+        log.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""Constant-memory verifier for downloaded chain files.
+
+Reads one block at a time and keeps only the previous block's hash, so it
+works on exports far larger than RAM. Understands the indented JSON array
+from /download, NDJSON from /chain/stream and raw segment-log files, plain
+or gzip-compressed, as well as the binary format of /download?format=bin.
+
+    python verify.py blockchain_data.json --difficulty 3
+
+JSON exports carry naive local-time ISO timestamps; run the verifier with
+the server's TZ (e.g. TZ=Asia/Ho_Chi_Minh) or every hash will mismatch.
+"""
+import argparse, gzip, json, os, struct, sys, time
+from typing import Any, Dict, IO, Iterator
+from blockchain import Block, check_block
+from chainbin import ChainFile, is_chain_file
+from storage import decode_record
+
+CHUNK_SIZE = 1 << 16
+_decoder = json.JSONDecoder()
+
+
+def iter_json_array(f: IO[str]) -> Iterator[Dict[str, Any]]:
+    """Yield the items of a top-level JSON array without loading the array."""
+    buf, pos, started = '', 0, False
+    eof = False
+    while True:
+        # skip whitespace and separators between items
+        while pos < len(buf) and buf[pos] in ' \t\r\n,[':
+            if buf[pos] == '[':
+                if started:
+                    break
+                started = True
+            pos += 1
+        if pos < len(buf) and buf[pos] == ']':
+            return
+        try:
+            item, end = _decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise ValueError('Truncated or malformed JSON array')
+            chunk = f.read(CHUNK_SIZE)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield item
+        pos = end
+
+
+def iter_lines(f: IO[str]) -> Iterator[Dict[str, Any]]:
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        if line[:1] == '{':
+            yield json.loads(line)
+        else:
+            record = decode_record((line + '\n').encode('utf-8'))
+            if record is None:
+                raise ValueError('Corrupt segment-log line')
+            yield record
+
+
+def iter_chain_file(f: IO[str]) -> Iterator[Dict[str, Any]]:
+    """Detect the format from the first non-blank character and stream its blocks."""
+    head = ''
+    while not head.strip():
+        chunk = f.read(1)
+        if not chunk:
+            return iter(())
+        head += chunk
+    if head.strip() == '[':
+        return iter_json_array(_Prefixed(head, f))
+    return iter_lines(_Prefixed(head, f))
+
+
+class _Prefixed:
+    """File wrapper that replays the characters consumed while sniffing the format."""
+
+    def __init__(self, prefix: str, f: IO[str]):
+        self._prefix, self._f = prefix, f
+
+    def read(self, size: int = -1) -> str:
+        prefix, self._prefix = self._prefix, ''
+        return prefix + self._f.read(size)
+
+    def __iter__(self):
+        first = self._prefix + self._f.readline()
+        self._prefix = ''
+        yield first
+        yield from self._f
+
+
+def to_block(item: Dict[str, Any]) -> Block:
+    # exports carry ISO timestamps, storage records the raw float
+    return Block.from_dict(item) if isinstance(item['timestamp'], str) else Block.from_record(item)
+
+
+def verify_stream(f: IO[str], difficulty: int = 3) -> Dict[str, Any]:
+    """Verify a chain read from ``f``; stops at the first invalid block."""
+    return verify_blocks((to_block(item) for item in iter_chain_file(f)), difficulty)
+
+
+def verify_blocks(blocks: Iterator[Block], difficulty: int = 3) -> Dict[str, Any]:
+    start = time.perf_counter()
+    prev_hash = None
+    count = 0
+    error = None
+    try:
+        for block in blocks:
+            if prev_hash is None and block.index == 0:
+                pass  # genesis is trusted, as in Blockchain.is_chain_valid
+            elif prev_hash is None:
+                error = f'Chain does not start at genesis (index {block.index})'
+            else:
+                error = check_block(block, prev_hash, difficulty)
+            count += 1
+            if error:
+                break
+            prev_hash = block.hash
+    except (ValueError, KeyError, TypeError, struct.error) as e:
+        error = f'Parse error after {count} blocks: {e}'
+    if error is None and count == 0:
+        error = 'Chain is empty (no genesis block)'
+    return {'valid': error is None, 'blocks': count, 'error': error,
+            'elapsed': time.perf_counter() - start}
+
+
+def verify_file(path: str, difficulty: int = 3) -> Dict[str, Any]:
+    if is_chain_file(path):
+        with ChainFile(path) as f:
+            report = verify_blocks(iter(f), difficulty)
+        report['bytes'] = os.path.getsize(path)
+        return report
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        report = verify_stream(f, difficulty)
+    report['bytes'] = os.path.getsize(path)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path')
+    parser.add_argument('--difficulty', type=int, default=3, help='minimum difficulty (blocks may record a higher one)')
+    args = parser.parse_args()
+    report = verify_file(args.path, args.difficulty)
+    elapsed = max(report['elapsed'], 1e-9)
+    print(f"{report['blocks']} blocks, {report['bytes'] / 2 ** 20:.1f} MiB in {elapsed:.2f}s "
+          f"({report['blocks'] / elapsed:,.0f} blocks/s, {report['bytes'] / 2 ** 20 / elapsed:.1f} MiB/s)")
+    if report['valid']:
+        print('Chain is valid')
+    else:
+        print(f"First failure: {report['error']}")
+    sys.exit(0 if report['valid'] else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -18,7 +18,8 @@ import queue
 import threading
 import json
 import hashlib
-from functools import wraps, lru_cache
+import sqlite3
+from functools import wraps
 from io import StringIO
 
 from flask import Flask, render_template, request, jsonify, send_file, Response, session
@@ -27,13 +28,13 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException
 
 import platform
 import requests
-from urllib.parse import quote_plus
+from urllib.parse import quote_plus, unquote
 import re
-from collections import defaultdict, OrderedDict
+from collections import defaultdict, OrderedDict, deque
 
 
 BASE_DIR = os.path.dirname(__file__)
@@ -59,6 +60,15 @@ class Config:
     SESSION_DEDUP_EXPIRY = 3600  # 1 hour for session deduplication
     MAX_RESULTS_PER_REQUEST = 100
     STREAM_CHUNK_SIZE = 5  # Stream results in chunks of 5
+    EXTRACT_DRIVERS = 2  # drivers per task for place details (the task's own + idle ones borrowed from the pool)
+    PLACE_CACHE = os.environ.get('PLACE_CACHE', os.path.join(BASE_DIR, 'data', 'place_cache.sqlite3'))  # "off" disables
+    PLACE_CACHE_TTL = int(os.environ.get('PLACE_CACHE_TTL', 7 * 24 * 3600))
+
+    BLOCKCHAIN_API = os.environ.get('BLOCKCHAIN_API', '')  # e.g. http://127.0.0.1:5000/add
+    SINK_BATCH_SIZE = 50  # records per POST /add_batch
+    SINK_FLUSH_INTERVAL = 2  # seconds to wait for a batch to fill
+    SINK_MAX_BUFFER = 500  # records kept in memory, the rest spill to the outbox on disk
+    SINK_MAX_BACKOFF = 60
 
 # -------------------- Session-based Deduplication Manager --------------------
 class SessionDeduplicationManager:
@@ -203,6 +213,107 @@ class InMemoryCache:
                 del self.cache[key]
                 del self.access_times[key]
 
+# -------------------- Persistent Place Detail Cache --------------------
+class PlaceDetailCache:
+    """Cache chi tiết địa điểm trên đĩa (SQLite), khóa theo place ID trong URL maps/place.
+
+    Cùng một địa điểm xuất hiện trong nhiều truy vấn khác nhau nên được lưu
+    theo địa điểm, không theo truy vấn như InMemoryCache; dữ liệu còn nguyên
+    sau khi khởi động lại và hết hạn sau ttl giây.
+    """
+    FEATURE_ID = re.compile(r'!1s(0x[0-9a-fA-F]+:0x[0-9a-fA-F]+)')
+    KNOWLEDGE_ID = re.compile(r'!16s([^!?&#]+)')
+
+    def __init__(self, path, ttl=Config.PLACE_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS places ('
+            'place_id TEXT PRIMARY KEY, record TEXT NOT NULL, '
+            'updated_at REAL NOT NULL, expires_at REAL NOT NULL)'
+        )
+        self.conn.commit()
+
+    @classmethod
+    def place_id(cls, url):
+        """ID ổn định của địa điểm: feature ID 0x..:0x.., nếu không có thì ID /g/.. ; None nếu không nhận ra"""
+        if not url or 'maps/place' not in url:
+            return None
+        match = cls.FEATURE_ID.search(url)
+        if match:
+            return match.group(1).lower()
+        match = cls.KNOWLEDGE_ID.search(url)
+        if match:
+            return unquote(match.group(1))
+        return None
+
+    def get(self, url) -> Optional[dict]:
+        place_id = self.place_id(url)
+        with self.lock:
+            row = None
+            if place_id:
+                row = self.conn.execute(
+                    'SELECT record FROM places WHERE place_id = ? AND expires_at > ?',
+                    (place_id, time.time())
+                ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, url, record, ttl=None):
+        place_id = self.place_id(url)
+        if not place_id:
+            return False
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO places (place_id, record, updated_at, expires_at) VALUES (?, ?, ?, ?)',
+                (place_id, json.dumps(record, ensure_ascii=False), now, now + (self.ttl if ttl is None else ttl))
+            )
+            self.conn.commit()
+        return True
+
+    def clear_expired(self):
+        """Xóa bản ghi hết hạn"""
+        with self.lock:
+            removed = self.conn.execute('DELETE FROM places WHERE expires_at <= ?', (time.time(),)).rowcount
+            self.conn.commit()
+        return removed
+
+    def get_stats(self):
+        with self.lock:
+            entries = self.conn.execute('SELECT COUNT(*) FROM places').fetchone()[0]
+            page_count = self.conn.execute('PRAGMA page_count').fetchone()[0]
+            page_size = self.conn.execute('PRAGMA page_size').fetchone()[0]
+            # dung lượng trên đĩa: file chính cộng file -wal (ghi gần đây nằm ở đó
+            # tới lần checkpoint kế tiếp, page_count đã tính cả các trang này)
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                size = page_count * page_size
+            try:
+                size += os.path.getsize(self.path + '-wal')
+            except OSError:
+                pass
+            lookups = self.hits + self.misses
+            return {
+                'path': self.path,
+                'entries': entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else None,
+                'bytes': size,
+                'ttl': self.ttl
+            }
+
 # -------------------- Response Compression --------------------
 def gzip_response(f):
     """Decorator để nén response"""
@@ -255,6 +366,10 @@ class TaskManager:
         with self.lock:
             return self.active_tasks.get(task_id)
     
+    def count_tasks(self, status: str) -> int:
+        with self.lock:
+            return sum(1 for t in self.active_tasks.values() if t['status'] == status)
+
     def remove_task(self, task_id: str):
         with self.lock:
             self.active_tasks.pop(task_id, None)
@@ -431,6 +546,23 @@ class DriverPool:
         
         raise Exception("Không thể lấy driver trong thời gian quy định")
 
+    def idle_count(self):
+        return self.available_drivers.qsize()
+
+    def get_idle_driver(self):
+        """Lấy driver đang rảnh mà không chờ và không tạo driver mới; None nếu không có"""
+        try:
+            driver, profile = self.available_drivers.get_nowait()
+        except queue.Empty:
+            return None
+        with self.lock:
+            if self.driver_usage.get(id(driver), 0) >= Config.DRIVER_REUSE_LIMIT:
+                # để get_driver thay driver này, không tạo Chrome mới chỉ để chia shard
+                self.available_drivers.put((driver, profile))
+                return None
+            self.busy_drivers.add(id(driver))
+        return driver, profile
+
     def return_driver(self, driver, profile):
         try:
             with self.lock:
@@ -470,27 +602,276 @@ class DriverPool:
             except:
                 pass
 
+# -------------------- Blockchain Result Sink --------------------
+class ResultSink:
+    """Đẩy kết quả lên blockchain API (POST /add_batch) ở nền.
+
+    submit() không bao giờ chờ mạng: bản ghi vào hàng đợi trong bộ nhớ (tối đa
+    max_buffer), phần dư được ghi nối vào outbox NDJSON trên đĩa. Worker gom lô,
+    dùng lại kết nối keep-alive, thử lại với backoff khi API chậm hoặc ngừng,
+    và gửi outbox (cũ nhất trước) khi API hoạt động lại, kể cả sau khi khởi động lại.
+    Vị trí đã gửi của mỗi file outbox lưu ở <file>.offset, nên khi khởi động lại
+    chỉ lô đang gửi dở có thể bị gửi lại (API nên bật DEDUP_RECORDS).
+    """
+    SPILL_FILE = 'spill.ndjson'
+
+    def __init__(self, api_url, outbox_dir, batch_size=Config.SINK_BATCH_SIZE,
+                 flush_interval=Config.SINK_FLUSH_INTERVAL, max_buffer=Config.SINK_MAX_BUFFER,
+                 max_backoff=Config.SINK_MAX_BACKOFF, timeout=10):
+        self.batch_url = self.batch_endpoint(api_url)
+        self.outbox_dir = outbox_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.buffer = deque()
+        self.oldest_at = None
+        self.lock = Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.stats = {
+            'submitted': 0, 'sent_records': 0, 'sent_batches': 0, 'duplicates': 0,
+            'spilled': 0, 'retries': 0, 'dropped': 0, 'failures': 0,
+            'last_error': None, 'last_success': None
+        }
+        self._inflight = None  # (records, None) từ bộ nhớ hoặc (records, (path, offset)) từ outbox
+        self._draining = None  # (path, offset) của file outbox đang gửi
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(outbox_dir, exist_ok=True)
+
+    @staticmethod
+    def batch_endpoint(api_url):
+        """BLOCKCHAIN_API có thể trỏ tới /add (như README) hoặc gốc của API"""
+        url = api_url.rstrip('/')
+        if url.endswith('/add_batch'):
+            return url
+        if url.endswith('/add'):
+            return url + '_batch'
+        return url + '/add_batch'
+
+    def submit(self, records):
+        """Đưa kết quả vào hàng đợi gửi; bỏ qua các bản ghi lỗi"""
+        records = [r for r in records if r.get('Tên địa điểm') != 'Lỗi lấy dữ liệu']
+        if not records:
+            return 0
+        with self.lock:
+            room = max(self.max_buffer - len(self.buffer), 0)
+            if room and not self.buffer:
+                self.oldest_at = time.time()
+            self.buffer.extend(records[:room])
+            if len(records) > room:
+                self._spill(records[room:])
+            self.stats['submitted'] += len(records)
+            if len(self.buffer) >= self.batch_size or len(records) > room:
+                self.wakeup.notify()
+        return len(records)
+
+    def _spill(self, records):
+        try:
+            with open(os.path.join(self.outbox_dir, self.SPILL_FILE), 'a', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.stats['spilled'] += len(records)
+        except OSError as e:
+            print(f"Lỗi ghi outbox: {e}")
+            self.stats['dropped'] += len(records)
+
+    def _seal_spill(self):
+        """Chốt file spill thành outbox-<ns>.ndjson để gửi, file spill mới bắt đầu lại từ đầu"""
+        with self.lock:
+            spill = os.path.join(self.outbox_dir, self.SPILL_FILE)
+            if os.path.exists(spill) and os.path.getsize(spill) > 0:
+                os.replace(spill, os.path.join(self.outbox_dir, f'outbox-{time.time_ns()}.ndjson'))
+                return True
+        return False
+
+    def _read_outbox(self):
+        while True:
+            if self._draining is None:
+                sealed = sorted(f for f in os.listdir(self.outbox_dir)
+                                if f.startswith('outbox-') and f.endswith('.ndjson'))
+                if not sealed and not self._seal_spill():
+                    return None
+                if not sealed:
+                    continue
+                path = os.path.join(self.outbox_dir, sealed[0])
+                self._draining = (path, self._load_offset(path))
+            path, offset = self._draining
+            records = []
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                while len(records) < self.batch_size:
+                    line = f.readline()
+                    if not line:
+                        break
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue  # dòng bị cắt dở khi tắt đột ngột
+                end = f.tell()
+            if records:
+                self._inflight = (records, (path, end))
+                return records
+            self._remove_outbox(path)
+            self._draining = None
+
+    @staticmethod
+    def _load_offset(path):
+        try:
+            with open(path + '.offset', 'r', encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    @staticmethod
+    def _save_offset(path, offset):
+        """Ghi vị trí đã gửi (file tạm + rename) để lần chạy sau không gửi lại từ đầu file"""
+        tmp = path + '.offset.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(str(offset))
+            os.replace(tmp, path + '.offset')
+        except OSError as e:
+            print(f"Lỗi ghi vị trí outbox: {e}")
+
+    @staticmethod
+    def _remove_outbox(path):
+        for p in (path, path + '.offset'):
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+
+    def _next_batch(self):
+        if self._inflight is not None:
+            return self._inflight[0]
+        with self.lock:
+            due = self.buffer and (len(self.buffer) >= self.batch_size or
+                                   time.time() - self.oldest_at >= self.flush_interval)
+        # outbox chứa bản ghi cũ hơn nên được gửi trước, trừ khi hàng đợi đã đủ lô
+        if not due or len(self.buffer) < self.batch_size:
+            records = self._read_outbox()
+            if records:
+                return records
+        if not due:
+            return None
+        with self.lock:
+            records = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+            self.oldest_at = time.time() if self.buffer else None
+            self._inflight = (records, None)
+        return records
+
+    def _commit(self):
+        records, source = self._inflight
+        self._inflight = None
+        if source is not None:
+            path, end = source
+            if end >= os.path.getsize(path):
+                self._remove_outbox(path)
+                self._draining = None
+            else:
+                self._save_offset(path, end)
+                self._draining = (path, end)
+
+    def _send(self, records):
+        """True khi xong lô (đã gửi hoặc bị API từ chối hẳn), False nếu cần thử lại"""
+        try:
+            response = self.session.post(self.batch_url, json={'records': records}, timeout=self.timeout)
+        except requests.RequestException as e:
+            self.stats['last_error'] = str(e)
+            return False
+        if response.status_code in (200, 202):
+            try:
+                self.stats['duplicates'] += len(response.json().get('duplicates') or [])
+            except ValueError:
+                pass
+            self.stats['sent_records'] += len(records)
+            self.stats['sent_batches'] += 1
+            self.stats['last_success'] = datetime.now().isoformat()
+            return True
+        self.stats['last_error'] = f'{response.status_code}: {response.text[:200]}'
+        if response.status_code == 429 or response.status_code >= 500:
+            return False
+        # 4xx khác: gửi lại cũng bị từ chối
+        print(f"Blockchain API từ chối {len(records)} bản ghi: {self.stats['last_error']}")
+        self.stats['dropped'] += len(records)
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            records = self._next_batch()
+            if records is None:
+                with self.lock:
+                    self.wakeup.wait(self.flush_interval)
+                continue
+            if self._send(records):
+                self._commit()
+                self.stats['failures'] = 0
+            else:
+                self.stats['failures'] += 1
+                self.stats['retries'] += 1
+                delay = min(self.max_backoff, 2 ** (self.stats['failures'] - 1))
+                self._stop.wait(delay * random.uniform(0.5, 1))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='result-sink', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def close(self, timeout=5):
+        """Dừng worker và ghi phần còn trong bộ nhớ ra outbox để gửi ở lần chạy sau"""
+        self._stop.set()
+        with self.lock:
+            self.wakeup.notify()
+        if self._thread:
+            self._thread.join(timeout)
+        with self.lock:
+            pending = list(self.buffer)
+            if self._inflight is not None and self._inflight[1] is None:
+                pending = self._inflight[0] + pending
+                self._inflight = None
+            self.buffer.clear()
+            if pending:
+                self._spill(pending)
+        self.session.close()
+
+    def outbox_bytes(self):
+        try:
+            return sum(e.stat().st_size for e in os.scandir(self.outbox_dir) if e.name.endswith('.ndjson'))
+        except OSError:
+            return 0
+
+    def get_stats(self):
+        with self.lock:
+            buffered = len(self.buffer)
+        return {
+            **self.stats,
+            'api': self.batch_url,
+            'buffered': buffered,
+            'in_flight': len(self._inflight[0]) if self._inflight else 0,
+            'outbox_bytes': self.outbox_bytes(),
+            'running': self._thread is not None and self._thread.is_alive()
+        }
+
 # Global instances
 task_manager = TaskManager()
 driver_pool = DriverPool()
 executor = ThreadPoolExecutor(max_workers=Config.MAX_CONCURRENT_TASKS)
 performance_monitor = PerformanceMonitor()  # Thêm monitor
+place_cache = PlaceDetailCache(Config.PLACE_CACHE) if Config.PLACE_CACHE != 'off' else None
+result_sink = (ResultSink(Config.BLOCKCHAIN_API, os.path.join(BASE_DIR, 'data', 'outbox'))
+               if Config.BLOCKCHAIN_API else None)
 
 # -------------------- Helper Functions --------------------
 async def run_in_executor(func, *args, **kwargs):
     loop = asyncio.get_event_loop()
     return await loop.run_in_executor(executor, func, *args, **kwargs)
 
-@lru_cache(maxsize=128)  # Cache kết quả xpath
-def get_text_by_xpath(driver, xpath, default='Không có dữ liệu', timeout=3):
-    try:
-        element = WebDriverWait(driver, timeout).until(
-            EC.presence_of_element_located((By.XPATH, xpath))
-        )
-        return element.text.strip() or default
-    except (TimeoutException, NoSuchElementException):
-        return default
-
 def wait_for_results_to_load(driver, min_results=5, max_wait=10):
     start_time = time.time()
     while time.time() - start_time < max_wait:
@@ -602,6 +983,173 @@ def scroll_and_collect_places(driver, target_count, max_scrolls=50, progress_cal
 
     return list(places_urls)[:target_count]
 
+# -------------------- Place Detail Extraction --------------------
+# Các selector dự phòng theo thứ tự ưu tiên cho từng trường
+PLACE_SELECTORS = {
+    'name': [
+        '//h1[@class="DUwDvf lfPIob"]',
+        '//h1',
+    ],
+    'address': [
+        "//div[contains(@class, 'Io6YTe') and contains(@class,'fdkmkc')]",
+        "//button[@data-item-id='address']//div[contains(@class, 'fontBodyMedium')]",
+        "//div[contains(@class, 'rogA2c')]//div[2]",
+    ],
+    'phone': [
+        "//button[contains(@data-item-id, 'phone')]//div[contains(@class, 'fontBodyMedium')]",
+        "//button[contains(@data-item-id, 'phone')]",
+        "//a[starts-with(@href, 'tel:')]",
+    ],
+    'website': [
+        "//a[contains(@data-item-id, 'authority')]",
+        "//button[contains(@data-item-id, 'authority')]//div[contains(@class, 'fontBodyMedium')]",
+        "//a[contains(@href, 'http') and not(contains(@href, 'google'))]",
+    ],
+}
+
+PLACE_DEFAULTS = {
+    'name': 'Không có tên',
+    'address': 'Không có địa chỉ',
+    'phone': 'Không có số điện thoại',
+    'website': 'Không có website',
+}
+
+# Chạy toàn bộ selector trong trình duyệt: một round trip WebDriver cho mỗi trang.
+# Trả về giá trị của từng trường và các lần thử [xpath, trúng, ms] theo thứ tự đã thử.
+EXTRACT_PLACE_JS = """
+const selectors = arguments[0];
+const find = (xpath) => {
+    try {
+        return document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    } catch (e) {
+        return null;
+    }
+};
+const valueOf = (field, node) => {
+    const text = (node.innerText || node.textContent || '').trim();
+    if (field !== 'website' || text.includes('http')) {
+        return text;
+    }
+    const href = node.getAttribute('href') || '';
+    return href.includes('http') && !href.includes('google') ? href : '';
+};
+const found = {};
+for (const [field, list] of Object.entries(selectors)) {
+    found[field] = {value: null, attempts: []};
+    for (const xpath of list) {
+        const started = performance.now();
+        const node = find(xpath);
+        const value = node ? valueOf(field, node) : '';
+        found[field].attempts.push([xpath, Boolean(value), performance.now() - started]);
+        if (value) {
+            found[field].value = value;
+            break;
+        }
+    }
+}
+return found;
+"""
+
+# Chỉ các trường này được sắp xếp lại; tên luôn thử h1 cụ thể trước h1 chung
+ADAPTIVE_FIELDS = ('address', 'phone', 'website')
+
+# Selector "bắt tất cả": kém chính xác hơn nên luôn được thử sau cùng
+CATCH_ALL_SELECTORS = {
+    "//a[contains(@href, 'http') and not(contains(@href, 'google'))]",
+}
+
+class SelectorStats:
+    """Thống kê trúng/trượt và độ trễ của từng selector, sắp xếp lại thứ tự thử.
+
+    Với các trường trong ADAPTIVE_FIELDS, mỗi selector cụ thể có điểm trung
+    bình trượt (EWMA) của tỉ lệ trúng; selector đang thắng được thử trước,
+    selector trượt liên tục bị đẩy xuống. Điểm chỉ thay đổi ở những trang mà
+    một selector cụ thể trúng: trang không có trường đó (mọi selector trượt,
+    hoặc chỉ catch-all trúng) không làm selector nào bị hạ. Catch-all luôn
+    đứng cuối. Cứ explore_every trang lại thử theo thứ tự gốc một lần để
+    selector đã bị hạ có cơ hội lấy lại điểm.
+    """
+    def __init__(self, selectors, adaptive_fields=ADAPTIVE_FIELDS, catch_all=CATCH_ALL_SELECTORS,
+                 alpha=0.1, explore_every=20):
+        self.selectors = {field: list(xpaths) for field, xpaths in selectors.items()}
+        self.adaptive_fields = set(adaptive_fields)
+        self.catch_all = set(catch_all)
+        self.alpha = alpha
+        self.explore_every = explore_every
+        self.stats = {
+            field: {xpath: {'hits': 0, 'misses': 0, 'total_ms': 0.0, 'score': 0.5} for xpath in xpaths}
+            for field, xpaths in self.selectors.items()
+        }
+        self.order = {field: list(xpaths) for field, xpaths in self.selectors.items()}
+        self.pages = 0
+        self.lock = Lock()
+
+    def ordered(self):
+        """Thứ tự thử cho trang kế tiếp"""
+        with self.lock:
+            self.pages += 1
+            if self.explore_every and self.pages % self.explore_every == 0:
+                return {field: list(xpaths) for field, xpaths in self.selectors.items()}
+            return {field: list(xpaths) for field, xpaths in self.order.items()}
+
+    def record(self, field, attempts):
+        """attempts: [(xpath, hit, ms), ...] theo thứ tự đã thử"""
+        with self.lock:
+            field_stats = self.stats.get(field)
+            if field_stats is None:
+                return
+            attempts = [a for a in attempts if a[0] in field_stats]
+            for xpath, hit, ms in attempts:
+                entry = field_stats[xpath]
+                entry['hits' if hit else 'misses'] += 1
+                entry['total_ms'] += ms
+            if field not in self.adaptive_fields:
+                return
+            if not any(hit and xpath not in self.catch_all for xpath, hit, _ in attempts):
+                return
+            for xpath, hit, _ in attempts:
+                if xpath not in self.catch_all:
+                    entry = field_stats[xpath]
+                    entry['score'] += self.alpha * ((1.0 if hit else 0.0) - entry['score'])
+            original = self.selectors[field]
+            specific = [x for x in original if x not in self.catch_all]
+            self.order[field] = sorted(specific, key=lambda x: (-field_stats[x]['score'], original.index(x))) + \
+                [x for x in original if x in self.catch_all]
+
+    def get_stats(self):
+        with self.lock:
+            report = {}
+            for field, order in self.order.items():
+                original = self.selectors[field]
+                report[field] = []
+                for position, xpath in enumerate(order):
+                    entry = self.stats[field][xpath]
+                    tries = entry['hits'] + entry['misses']
+                    report[field].append({
+                        'selector': xpath,
+                        'position': position,
+                        'original_position': original.index(xpath),
+                        'pinned': field not in self.adaptive_fields or xpath in self.catch_all,
+                        'hits': entry['hits'],
+                        'misses': entry['misses'],
+                        'hit_rate': entry['hits'] / tries if tries else None,
+                        'avg_ms': entry['total_ms'] / tries if tries else None,
+                        'score': round(entry['score'], 4)
+                    })
+            return report
+
+selector_stats = SelectorStats(PLACE_SELECTORS)
+
+def extract_place_details(driver):
+    """Lấy tên, địa chỉ, số điện thoại, website của trang địa điểm đang mở bằng một execute_script"""
+    found = driver.execute_script(EXTRACT_PLACE_JS, selector_stats.ordered()) or {}
+    details = {}
+    for field, default in PLACE_DEFAULTS.items():
+        outcome = found.get(field) or {}
+        selector_stats.record(field, outcome.get('attempts') or [])
+        details[field] = outcome.get('value') or default
+    return details
+
 def extract_place_info_batch(driver, place_urls, progress_callback=None):
     """Xử lý nhiều địa điểm cùng lúc để tối ưu hóa"""
     results = []
@@ -610,64 +1158,18 @@ def extract_place_info_batch(driver, place_urls, progress_callback=None):
     for i, place_url in enumerate(place_urls):
         try:
             driver.get(place_url)
-            time.sleep(random.uniform(0.5, 1))
             WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.TAG_NAME, 'h1')))
 
-            name = get_text_by_xpath(driver, '//h1[@class="DUwDvf lfPIob"]', 'Không có tên')
-            if name == 'Không có tên':
-                name = get_text_by_xpath(driver, '//h1', 'Không có tên')
-
-            address_selectors = [
-                "//div[contains(@class, 'Io6YTe') and contains(@class,'fdkmkc')]",
-                "//button[@data-item-id='address']//div[contains(@class, 'fontBodyMedium')]",
-                "//div[contains(@class, 'rogA2c')]//div[2]",
-            ]
-            address = 'Không có địa chỉ'
-            for selector in address_selectors:
-                address = get_text_by_xpath(driver, selector, 'Không có địa chỉ')
-                if address != 'Không có địa chỉ':
-                    break
-
-            phone_selectors = [
-                "//button[contains(@data-item-id, 'phone')]//div[contains(@class, 'fontBodyMedium')]",
-                "//button[contains(@data-item-id, 'phone')]",
-                "//a[starts-with(@href, 'tel:')]",
-            ]
-            phone = 'Không có số điện thoại'
-            for selector in phone_selectors:
-                phone = get_text_by_xpath(driver, selector, 'Không có số điện thoại')
-                if phone != 'Không có số điện thoại' and phone.strip():
-                    break
-
-            website_selectors = [
-                "//a[contains(@data-item-id, 'authority')]",
-                "//button[contains(@data-item-id, 'authority')]//div[contains(@class, 'fontBodyMedium')]",
-                "//a[contains(@href, 'http') and not(contains(@href, 'google'))]",
-            ]
-            website = 'Không có website'
-            for selector in website_selectors:
-                element_text = get_text_by_xpath(driver, selector, 'Không có website')
-                if element_text != 'Không có website' and 'http' in element_text:
-                    website = element_text
-                    break
-                try:
-                    elem = driver.find_element(By.XPATH, selector)
-                    href = elem.get_attribute('href')
-                    if href and 'http' in href and 'google' not in href:
-                        website = href
-                        break
-                except:
-                    continue
-
+            details = extract_place_details(driver)
             result = {
-                'Tên địa điểm': name,
-                'Địa chỉ': address,
-                'Số điện thoại': phone,
-                'Website': website
+                'Tên địa điểm': details['name'],
+                'Địa chỉ': details['address'],
+                'Số điện thoại': details['phone'],
+                'Website': details['website']
             }
             results.append(result)
             
-            if name != 'Lỗi lấy dữ liệu':
+            if result['Tên địa điểm'] != 'Lỗi lấy dữ liệu':
                 successful_extracts += 1
                 
         except Exception as e:
@@ -687,6 +1189,99 @@ def extract_place_info_batch(driver, place_urls, progress_callback=None):
     
     return results, successful_extracts
 
+def extract_place_info_sharded(driver, place_urls, num_drivers=1, progress_callback=None):
+    """Chia URL cho nhiều driver trong pool, gộp kết quả theo đúng thứ tự ban đầu.
+
+    Shard 0 chạy trên driver của task; chỉ mượn thêm driver đang rảnh (không
+    chờ, không tạo Chrome mới), chừa lại một driver cho mỗi task đang xếp
+    hàng chờ driver, và trả lại ngay khi xong.
+    """
+    num_drivers = max(1, min(num_drivers, driver_pool.max_drivers, len(place_urls)))
+    drivers = [(driver, None)]
+    try:
+        waiting_tasks = task_manager.count_tasks('queued')
+        while len(drivers) < num_drivers and driver_pool.idle_count() > waiting_tasks:
+            borrowed = driver_pool.get_idle_driver()
+            if borrowed is None:
+                break
+            drivers.append(borrowed)
+
+        n = len(drivers)
+        if n == 1:
+            return extract_place_info_batch(driver, place_urls, progress_callback)
+
+        # Chia xen kẽ để các shard có tiến độ đều nhau
+        shard_indexes = [list(range(k, len(place_urls), n)) for k in range(n)]
+        shard_done = [0] * n
+        shard_ok = [0] * n
+        progress_lock = Lock()
+
+        def shard_progress(k):
+            def callback(progress, current, successful):
+                with progress_lock:
+                    shard_done[k] = current
+                    shard_ok[k] = successful
+                    done, ok = sum(shard_done), sum(shard_ok)
+                if progress_callback:
+                    progress_callback(done / len(place_urls) * 100, done, ok)
+            return callback
+
+        def run_shard(k):
+            urls = [place_urls[i] for i in shard_indexes[k]]
+            return extract_place_info_batch(drivers[k][0], urls, shard_progress(k))
+
+        results = [None] * len(place_urls)
+        successful_extracts = 0
+        with ThreadPoolExecutor(max_workers=n - 1) as shard_executor:
+            futures = {k: shard_executor.submit(run_shard, k) for k in range(1, n)}
+            outcomes = {0: run_shard(0)}
+            for k, future in futures.items():
+                try:
+                    outcomes[k] = future.result()
+                except Exception as e:
+                    print(f"Lỗi shard {k}: {e}")
+                    outcomes[k] = ([None] * len(shard_indexes[k]), 0)
+
+        for k, (shard_results, shard_successful) in outcomes.items():
+            successful_extracts += shard_successful
+            for i, result in zip(shard_indexes[k], shard_results):
+                results[i] = result or {
+                    'Tên địa điểm': 'Lỗi lấy dữ liệu',
+                    'Địa chỉ': 'Lỗi lấy dữ liệu',
+                    'Số điện thoại': 'Lỗi lấy dữ liệu',
+                    'Website': 'Lỗi lấy dữ liệu'
+                }
+        return results, successful_extracts
+    finally:
+        for extra_driver, profile in drivers[1:]:
+            driver_pool.return_driver(extra_driver, profile)
+
+def extract_place_info_cached(driver, place_urls, num_drivers=1, progress_callback=None):
+    """Lấy chi tiết từ place_cache trước; chỉ những địa điểm chưa có mới được mở bằng driver"""
+    if place_cache is None:
+        return extract_place_info_sharded(driver, place_urls, num_drivers, progress_callback)
+
+    results = [place_cache.get(url) for url in place_urls]
+    missing = [i for i, result in enumerate(results) if result is None]
+    cached = len(place_urls) - len(missing)
+    if progress_callback and cached:
+        progress_callback(cached / len(place_urls) * 100, cached, cached)
+    if not missing:
+        return results, cached
+
+    def missing_progress(progress, current, successful):
+        if progress_callback:
+            progress_callback((cached + current) / len(place_urls) * 100, cached + current, cached + successful)
+
+    scraped, successful_extracts = extract_place_info_sharded(
+        driver, [place_urls[i] for i in missing], num_drivers, missing_progress
+    )
+    for i, result in zip(missing, scraped):
+        results[i] = result
+        if result['Tên địa điểm'] not in ('Lỗi lấy dữ liệu', PLACE_DEFAULTS['name']):
+            place_cache.set(place_urls[i], result)
+    return results, cached + successful_extracts
+
 # -------------------- GPS Optimization Functions --------------------
 def build_gps_optimized_url(keyword: str, lat: float, lng: float) -> str:
     """Build GPS-optimized Google Maps search URL"""
@@ -794,8 +1389,10 @@ def process_scraping_task(task_id: str, search_params: dict):
                 'successful_extracts': successful
             })
 
-        results, successful_extracts = extract_place_info_batch(
-            driver, places_urls, extract_progress
+        results, successful_extracts = extract_place_info_cached(
+            driver, places_urls,
+            search_params.get('extract_drivers', Config.EXTRACT_DRIVERS),
+            extract_progress
         )
 
         if session_id:
@@ -822,6 +1419,9 @@ def process_scraping_task(task_id: str, search_params: dict):
             writer.writeheader()
             writer.writerows(results)
 
+        if result_sink:
+            result_sink.submit(results)
+
         task_manager.cache_result(
             search_params['search_key'],
             search_params['num_results'],
@@ -1045,6 +1645,12 @@ def search():
     except ValueError:
         return jsonify({'error': 'Số lượng kết quả không hợp lệ'}), 400
 
+    try:
+        extract_drivers = int(request.form.get('extract_drivers', Config.EXTRACT_DRIVERS) or Config.EXTRACT_DRIVERS)
+    except ValueError:
+        return jsonify({'error': 'Số driver trích xuất không hợp lệ'}), 400
+    extract_drivers = max(1, min(extract_drivers, driver_pool.max_drivers))
+
     lat_str = (request.form.get('lat') or '').strip()
     lng_str = (request.form.get('lng') or '').strip()
     
@@ -1076,7 +1682,8 @@ def search():
         'lat': lat_str,
         'lng': lng_str,
         'session_id': session_id,  # Added session tracking
-        'gps_enabled': bool(lat_str and lng_str)  # GPS flag
+        'gps_enabled': bool(lat_str and lng_str),  # GPS flag
+        'extract_drivers': extract_drivers
     }
 
     task_manager.add_task(task_id, {
@@ -1176,7 +1783,10 @@ def system_status():
         'max_drivers': driver_pool.max_drivers,
         'performance': performance_monitor.get_stats(),
         'cache_size': len(task_manager.cache.cache),
-        'memory_usage': performance_monitor.get_memory_usage()
+        'memory_usage': performance_monitor.get_memory_usage(),
+        'result_sink': result_sink.get_stats() if result_sink else None,
+        'selectors': selector_stats.get_stats(),
+        'place_cache': place_cache.get_stats() if place_cache else None
     })
 
 @app.route('/system/clear-cache', methods=['POST'])
@@ -1211,6 +1821,8 @@ def periodic_maintenance():
         cleanup_old_tasks()
         task_manager.cache.clear_expired()
         task_manager.dedup_manager.cleanup_expired_sessions()
+        if place_cache:
+            place_cache.clear_expired()
         
         if performance_monitor.should_trigger_gc():
             gc.collect()
@@ -1220,6 +1832,8 @@ def periodic_maintenance():
 # Start background threads
 cleanup_thread = threading.Thread(target=periodic_maintenance, daemon=True)
 cleanup_thread.start()
+if result_sink:
+    result_sink.start()
 
 # -------------------- Main --------------------
 if __name__ == '__main__':
@@ -1233,6 +1847,8 @@ if __name__ == '__main__':
         print(f"💾 Cache size limit: {Config.MAX_CACHE_SIZE}")
         print(f"🌍 GPS optimization enabled")
         print(f"🔄 Session deduplication enabled")
+        if result_sink:
+            print(f"⛓️  Sending results to {result_sink.batch_url}")
         
         # Initialize driver pool
         print("🔧 Initializing driver pool...")
@@ -1255,6 +1871,8 @@ if __name__ == '__main__':
         try:
             driver_pool.cleanup()
             executor.shutdown(wait=True)
+            if result_sink:
+                result_sink.close()
         except:
             pass
         print("✅ Server shutdown complete")